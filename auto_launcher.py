@@ -6,12 +6,19 @@ Runs as a background service and ensures FastAPI + Learning Worker are always re
 import subprocess
 import sys
 import os
+import socket
 import time
 from pathlib import Path
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import json
 import threading
 
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+# Service output goes to files here (a pipe nobody reads would fill and block them)
+LOG_DIR = Path(__file__).parent / "logs"
+
+
 class ServiceManager:
     def __init__(self):
         self.api_process = None
@@ -31,6 +38,26 @@ class ServiceManager:
             raise FileNotFoundError(f"Virtual environment not found at {venv_path}")
         return str(python_exe)
     
+    def _spawn(self, cmd, cwd, log_name):
+        """Start a service with stdout and stderr appended to LOG_DIR/log_name"""
+        LOG_DIR.mkdir(exist_ok=True)
+        with open(LOG_DIR / log_name, "ab", buffering=0) as log:
+            # The child keeps its own copy of the descriptor
+            return subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    
+    def _wait_for_api(self, timeout=5.0):
+        """Poll the API port until it accepts connections (or the server exits)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.api_process.poll() is not None:
+                return False
+            try:
+                with socket.create_connection((API_HOST, API_PORT), timeout=0.1):
+                    return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+    
     def ensure_services_running(self):
         """Auto-start services if they're not already running"""
         if self.are_services_running():
@@ -59,30 +86,18 @@ class ServiceManager:
                 "-m", "uvicorn",
                 "api.main:app",
                 "--host", "0.0.0.0",
-                "--port", "8000"
+                "--port", str(API_PORT)
             ]
             
-            self.api_process = subprocess.Popen(
-                cmd,
-                cwd=str(docs_dir),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
+            self.api_process = self._spawn(cmd, str(docs_dir), "api.log")
             
-            time.sleep(2)  # Wait for server to start
+            # Start the worker once the server is accepting connections
+            if not self._wait_for_api():
+                print("Warning: API server not ready yet, starting worker anyway")
             
             # Start learning worker
             cmd = [self.python_exe, "-m", "learning.worker"]
-            self.worker_process = subprocess.Popen(
-                cmd,
-                cwd=str(docs_dir),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
+            self.worker_process = self._spawn(cmd, str(docs_dir), "worker.log")
             
             self.auto_started = True
             return True
@@ -93,19 +108,18 @@ class ServiceManager:
     def stop_services(self):
         """Stop both services"""
         try:
-            if self.api_process:
-                self.api_process.terminate()
-                time.sleep(1)
-                if self.api_process.poll() is None:
-                    self.api_process.kill()
-                self.api_process = None
-            
-            if self.worker_process:
-                self.worker_process.terminate()
-                time.sleep(1)
-                if self.worker_process.poll() is None:
-                    self.worker_process.kill()
-                self.worker_process = None
+            processes = [p for p in (self.api_process, self.worker_process) if p]
+            # Signal both first so they shut down in parallel
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            self.api_process = None
+            self.worker_process = None
             
             return True
         except Exception as e:
@@ -185,6 +199,7 @@ def run_launcher():
         print()
         print("✓ Launcher running on http://localhost:9000")
         print("✓ Services will auto-start when needed")
+        print(f"✓ Service logs: {LOG_DIR}")
         print()
         print("Endpoints:")
         print("  /start   - Auto-start services if needed")
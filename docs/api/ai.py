@@ -1,4 +1,4 @@
-from model.network import PolicyValueNet
+from model.network import PolicyValueNet, inference_forward
 from model.encoder import encode_state, decode_move, encode_move
 from model.replay_buffer import ReplayBuffer
 import torch
@@ -20,12 +20,38 @@ model = PolicyValueNet()  # Fallback model if learner not available
 # the API won't receive the learner instance. In that case, we support
 # hot-reloading the checkpoint file whenever the worker saves a new one.
 _checkpoint_lock = threading.Lock()
+# Serializes model forwards of concurrent infer_move calls
+_inference_lock = threading.Lock()
 _checkpoint_last_mtime: float | None = None
 _checkpoint_last_check_ts: float = 0.0
 _checkpoint_min_check_interval_sec: float = float(
     os.getenv("CHECKERS_AI_CHECKPOINT_RELOAD_INTERVAL_SEC", "2.0")
 )
 
+# Opt-in: trace + freeze the fallback model with TorchScript after each load
+_jit_inference: bool = os.getenv("CHECKERS_AI_JIT_INFERENCE", "0") == "1"
+# Opt-in: INT8 dynamic quantization of the fallback model's Linear layers
+_quantize_inference: bool = os.getenv("CHECKERS_AI_QUANTIZE_INFERENCE", "0") == "1"
+# Opt-in: Intel Extension for PyTorch (oneDNN Conv+BN+ReLU fusion) on CPU
+_ipex_inference: bool = os.getenv("CHECKERS_AI_IPEX_INFERENCE", "0") == "1"
+# Opt-in: keep only policy outputs for actions seen in the replay buffer
+_slice_policy_head: bool = os.getenv("CHECKERS_AI_SLICE_POLICY_HEAD", "0") == "1"
+
+
+def _maybe_slice_policy_head(inference_model) -> None:
+    """Slice the policy head to the replay buffer's actions if enabled."""
+    if not _slice_policy_head:
+        return
+    try:
+        action_indices = replay_buffer.get_action_indices()
+    except Exception as e:
+        print(f"WARNING: Could not read action indices for policy head slicing: {e}")
+        return
+    if not action_indices:
+        print("WARNING: Replay buffer has no moves yet; policy head left unsliced")
+        return
+    inference_model.slice_policy_head(action_indices)
+
 # Load model if checkpoint exists
 MODEL_PATH = "checkpoints/model.pth"
 if os.path.exists(MODEL_PATH):
@@ -47,14 +73,39 @@ if os.path.exists(MODEL_PATH):
 else:
     print("No checkpoint found. Using untrained model")
 
+# The fallback model is inference-only: fold its BatchNorms into the convs
+model.fuse_for_inference()
+_maybe_slice_policy_head(model)
+if _quantize_inference:
+    model = model.quantize_for_inference()
+elif _ipex_inference:
+    model = model.ipex_optimize()
+if _jit_inference:
+    model.compile_for_inference()
+
 
 def _load_checkpoint_into_model(checkpoint_path: str) -> None:
-    """Load checkpoint weights into the global fallback model."""
-    global MODEL_VERSION
+    """
+    Load checkpoint weights into a fresh fallback model and swap it in.
+
+    The fused inference model can't take an unfused state_dict, so weights
+    are loaded into a new model, fused, and then published in one assignment
+    (requests in flight keep using the previous model).
+    """
+    global MODEL_VERSION, model
 
     checkpoint = torch.load(checkpoint_path, weights_only=False)
-    model.load_state_dict(checkpoint["model_state_dict"])
-    model.eval()
+    fresh_model = PolicyValueNet()
+    fresh_model.load_state_dict(checkpoint["model_state_dict"])
+    fresh_model.fuse_for_inference()
+    _maybe_slice_policy_head(fresh_model)
+    if _quantize_inference:
+        fresh_model = fresh_model.quantize_for_inference()
+    elif _ipex_inference:
+        fresh_model = fresh_model.ipex_optimize()
+    if _jit_inference:
+        fresh_model.compile_for_inference()
+    model = fresh_model
     MODEL_VERSION = f"v{checkpoint.get('training_steps', 0)}"
 
 
@@ -185,26 +236,24 @@ def infer_move(req):
     
     # CRITICAL: Use live model for inference (never the training model)
     inference_model = get_inference_model()
+    # The learner may keep its live model on GPU
+    state_tensor = state_tensor.to(next(inference_model.parameters()).device)
     
-    # Get action probabilities from model
-    with torch.no_grad():
-        policy, value = inference_model(state_tensor)
-        
-        # Mask illegal moves
-        mask = torch.zeros_like(policy)
-        mask[0, legal_move_indices] = 1.0
-        masked_policy = policy * mask
-        
-        # Renormalize
-        masked_policy = masked_policy / (masked_policy.sum() + 1e-8)
-        
-        # Add some exploration (10% random moves during learning)
-        if np.random.random() < 0.1 and len(encoded_moves) > 1:
-            selected_move, _ = encoded_moves[np.random.randint(0, len(encoded_moves))]
-            return selected_move, MODEL_VERSION
+    # Add some exploration (10% random moves during learning)
+    if np.random.random() < 0.1 and len(encoded_moves) > 1:
+        selected_move, _ = encoded_moves[np.random.randint(0, len(encoded_moves))]
+        return selected_move, MODEL_VERSION
 
-        # Select action index with highest probability
-        best_move_idx = legal_move_indices[masked_policy[0, legal_move_indices].argmax().item()]
+    # Get policy logits from model
+    with torch.inference_mode():
+        # Requests run on worker threads, and the CUDA graph forward returns
+        # shared static outputs, so read the logits before releasing the lock
+        with _inference_lock:
+            policy_logits, value = inference_forward(inference_model, state_tensor)
+
+            # Select the legal action index with the highest probability (softmax
+            # is monotonic, so the argmax over the legal logits is the same move)
+            best_move_idx = legal_move_indices[policy_logits[0, legal_move_indices].argmax().item()]
 
         # If multiple moves share this index, pick the first matching move
         # in the original request order (stable + always legal).
@@ -648,6 +697,8 @@ def record_game(req):
             
             print(f"Processing {len(req.trajectory)} trajectory steps")
             
+            # Collected and written in one transaction after the loop
+            steps = []
             for i, step in enumerate(req.trajectory):
                 try:
                     is_terminal = (i == len(req.trajectory) - 1)
@@ -670,22 +721,24 @@ def record_game(req):
                     heuristic_score = getattr(step, 'heuristic_score', 0.0)
                     heuristic_move = getattr(step, 'heuristic_move', None)
 
-                    replay_buffer.add_trajectory(
-                        game_id=req.game_id,
-                        move_number=i,
-                        board_state=step.board_state,
-                        action=step.action,
-                        reward=reward,  # Backend-calculated reward
-                        next_state=step.next_state,
-                        done=is_terminal,
-                        player=step_player,
-                        heuristic_score=heuristic_score,
-                        heuristic_move=heuristic_move
-                    )
+                    steps.append({
+                        'move_number': i,
+                        'board_state': step.board_state,
+                        'action': step.action,
+                        'reward': reward,  # Backend-calculated reward
+                        'next_state': step.next_state,
+                        'done': is_terminal,
+                        'player': step_player,
+                        'heuristic_score': heuristic_score,
+                        'heuristic_move': heuristic_move
+                    })
                 except Exception as step_error:
                     print(f"WARNING: Error processing step {i}: {step_error}")
                     # Continue processing other steps
                     continue
+            
+            if steps:
+                replay_buffer.add_batch_trajectories(req.game_id, steps)
         
         # Print buffer statistics
         stats = replay_buffer.get_stats()
@@ -4,12 +4,20 @@ from api.schemas import MoveRequest, ResultRequest, MoveResponse, StatsResponse
 from api.ai import infer_move, record_game, replay_buffer
 import config
 import logging
+import asyncio
+from contextlib import asynccontextmanager
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format=config.LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Checkers Online Learning AI", version=config.MODEL_VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """On shutdown, close the replay buffer's pooled aiosqlite connections."""
+    yield
+    await replay_buffer.aclose()
+
+app = FastAPI(title="Checkers Online Learning AI", version=config.MODEL_VERSION, lifespan=lifespan)
 
 # Enable CORS for frontend integration  
 # Allow all origins for local development (including file:// protocol)
@@ -25,7 +33,7 @@ app.add_middleware(
 async def health_check():
     """Health check endpoint to verify system status."""
     try:
-        stats = replay_buffer.get_stats()
+        stats = await replay_buffer.get_stats_async()
         return {
             "status": "healthy",
             "version": config.MODEL_VERSION,
@@ -60,7 +68,8 @@ async def ai_move(req: MoveRequest):
     """
     try:
         logger.info(f"Processing move request for game {req.game_id}")
-        move, version = infer_move(req)
+        # Encoding and the forward pass run off the event loop
+        move, version = await asyncio.to_thread(infer_move, req)
         return MoveResponse(
             ai_move=move,
             model_version=version
@@ -90,7 +99,7 @@ async def ai_stats():
     """
     try:
         from api.ai import learner
-        stats = replay_buffer.get_stats()
+        stats = await replay_buffer.get_stats_async()
         # Check if learner is connected and not paused
         stats['learning_active'] = learner is not None and not getattr(learner, 'learning_paused', True)
         
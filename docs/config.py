@@ -55,6 +55,10 @@ BOARD_SIZE = 10
 NUM_CHANNELS = 5  # red, red_king, black, black_king, valid_squares
 # Action space (v2): 50 playable squares x 50 playable squares = 2500.
 # This supports flying kings because each landing square is uniquely representable.
+# A smaller from-square x direction (50 x 8) space cannot represent these moves:
+# flying kings land at any distance, and a multi-capture is stored as
+# (start, final landing square), which need not share a diagonal with the start.
+# Changing this also breaks existing checkpoints and the global TF.js model.
 NUM_ACTIONS = 2500
 CONV_CHANNELS = [64, 128, 128]
 RESIDUAL_BLOCKS = 2
@@ -12,8 +12,9 @@ from datetime import datetime
 import torch
 import numpy as np
 import os
+from collections import OrderedDict
 from model.network import AdvancedPolicyValueNet
-from model.encoder import encode_state, encode_move
+from model.encoder import board_to_codes, encode_codes, encode_move
 
 class SelfPlayGenerator:
     """Generates self-play games for training data diversity."""
@@ -44,6 +45,12 @@ class SelfPlayGenerator:
         else:
             print("Warning: SelfPlayGenerator using untrained model (random weights)")
         
+        # Every game starts from the same position, so positions recur across
+        # games; the model is fixed for this generator's lifetime, so its
+        # outputs are cached per position (LRU keyed by the piece codes)
+        self._prediction_cache = OrderedDict()
+        self._prediction_cache_size = 65536
+        
     def generate_games(self, num_games=10, max_moves=200, exploration_epsilon=0.1):
         """
         Generate self-play training games.
@@ -85,6 +92,9 @@ class SelfPlayGenerator:
         """
         # Initialize board (10x10 international draughts starting position)
         board = self._initialize_board()
+        # Piece codes of `board`, computed once per position and reused for
+        # move selection and for both trajectory rows that hold it
+        codes = board_to_codes(board)
         game_history = []
         current_player = "black"  # AI starts (or random if desired, but std is white/black logic)
         move_count = 0
@@ -102,10 +112,11 @@ class SelfPlayGenerator:
             if random.random() < exploration_epsilon:
                 move = random.choice(legal_moves)
             else:
-                move = self._select_move_network(board, legal_moves, current_player)
+                move = self._select_move_network(codes, legal_moves, current_player)
             
             # Apply move
             next_board = self._apply_move(board, move, current_player)
+            next_codes = board_to_codes(next_board)
             
             # Record transition (only for black/AI moves, or BOTH for full self-play training?)
             # Standard is to record perspectives for the learner. 
@@ -114,15 +125,15 @@ class SelfPlayGenerator:
             # For simplicity, we record BLACK's moves as training data.
             if current_player == "black":
                 game_history.append({
-                    "board_state": self._board_to_json(board),
+                    "board_state": codes,
                     "action": move,
                     "player": current_player,
-                    "next_state": self._board_to_json(next_board),
+                    "next_state": next_codes,
                     "move_number": len(game_history)
                 })
             
             # Update state
-            board = next_board
+            board, codes = next_board, next_codes
             current_player = "red" if current_player == "black" else "black"
             move_count += 1
         
@@ -141,17 +152,18 @@ class SelfPlayGenerator:
                 )
                 
                 # Add trajectories (rewards will be calculated by backend)
-                for step in game_history:
-                    self.replay_buffer.add_trajectory(
-                        game_id=game_id,
-                        move_number=step["move_number"],
-                        board_state=step["board_state"],
-                        action=step["action"],
-                        reward=0.0,  # Placeholder - backend calculates
-                        next_state=step["next_state"],
-                        done=(step["move_number"] == len(game_history) - 1),
-                        player=step["player"]
-                    )
+                self.replay_buffer.add_batch_trajectories(game_id, [
+                    {
+                        'move_number': step["move_number"],
+                        'board_state': step["board_state"],
+                        'action': step["action"],
+                        'reward': 0.0,  # Placeholder - backend calculates
+                        'next_state': step["next_state"],
+                        'done': step["move_number"] == len(game_history) - 1,
+                        'player': step["player"]
+                    }
+                    for step in game_history
+                ])
             except Exception as e:
                 print(f"Warning: Failed to store self-play game: {e}")
         
@@ -162,8 +174,8 @@ class SelfPlayGenerator:
             "trajectory": game_history
         }
 
-    def _select_move_network(self, board, legal_moves, color):
-        """Select best move using the neural network."""
+    def _select_move_network(self, codes, legal_moves, color):
+        """Select best move using the neural network (`codes`: the board's piece codes)."""
         try:
             # 1. Encode State
             # Note: We need to respect the perspective. 
@@ -171,11 +183,17 @@ class SelfPlayGenerator:
             # We assume the model learns from "Black's perspective" typically.
             # But if Red is playing, should we flip? 
             # Current encoder handles pieces by color name.
-            json_board = self._board_to_json(board)
-            state_tensor = torch.tensor(encode_state(json_board), dtype=torch.float32).unsqueeze(0).to(self.device)
-            
-            with torch.no_grad():
-                policy_logits, _ = self.model(state_tensor)
+            cache_key = codes.tobytes()
+            policy_probs = self._prediction_cache.get(cache_key)
+            if policy_probs is None:
+                state_tensor = torch.from_numpy(encode_codes(codes)).unsqueeze(0).to(self.device)
+                probs, _ = self.model.predict(state_tensor)
+                policy_probs = probs[0].cpu().numpy()
+                self._prediction_cache[cache_key] = policy_probs
+                if len(self._prediction_cache) > self._prediction_cache_size:
+                    self._prediction_cache.popitem(last=False)
+            else:
+                self._prediction_cache.move_to_end(cache_key)
             
             # 2. Mask Legal Moves
             # Retrieve encoded indices for all legal moves
@@ -196,10 +214,8 @@ class SelfPlayGenerator:
             best_move = None
             best_prob = -1.0
             
-            # Simple greedy selection from logits
+            # Simple greedy selection from the policy
             # For better play, we could use softmax distribution sampling
-            policy_probs = torch.softmax(policy_logits, dim=1).cpu().numpy()[0]
-            
             for move, idx in move_candidates:
                 if idx < len(policy_probs):
                     prob = policy_probs[idx]
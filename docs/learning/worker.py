@@ -1,14 +1,68 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 import numpy as np
 from model.network import AdvancedPolicyValueNet, PolicyValueNet  # Use advanced network
-from model.encoder import encode_state, encode_move
+from model.encoder import EMPTY, BLACK_MAN
 from model.replay_buffer import ReplayBuffer
 from learning.curriculum import CurriculumManager, AdaptiveExploration
 from learning.evaluator import AIEvaluator
 import time
 import os
+import threading
+import queue
+from collections import deque
+
+def _cpu_snapshot(obj):
+    """Recursively copy every tensor in a (nested) state dict to CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, dict):
+        return {k: _cpu_snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_snapshot(v) for v in obj)
+    return obj
+
+
+def _a2c_losses(policy_logits, values, actions, advantages, returns):
+    """
+    Core A2C loss terms as a pure tensor function (compilable as one graph).
+    
+    Returns:
+        (policy_loss, value_loss, entropy)
+    """
+    # === POLICY LOSS ===
+    log_probs = F.log_softmax(policy_logits.float(), dim=1)
+    selected_log_probs = log_probs.gather(1, actions.unsqueeze(1)).squeeze(1)
+    policy_loss = -(selected_log_probs * advantages).mean()
+    
+    # === VALUE LOSS ===
+    # Value regression stays in FP32; BF16 is too coarse for the MSE
+    value_loss = F.mse_loss(values.float().squeeze(-1), returns)
+    
+    # === ENTROPY BONUS ===
+    entropy = -(log_probs.exp() * log_probs).sum(dim=1).mean()
+    
+    return policy_loss, value_loss, entropy
+
+
+class _RollingWindow(deque):
+    """Fixed-size window of floats with an O(1) running mean."""
+    
+    def __init__(self, maxlen: int):
+        super().__init__(maxlen=maxlen)
+        self._sum = 0.0
+    
+    def append(self, value: float):
+        if len(self) == self.maxlen:
+            self._sum -= self[0]
+        super().append(value)
+        self._sum += value
+    
+    def mean(self) -> float:
+        return self._sum / len(self) if self else 0.0
+
 
 class A2CLearner:
     """
@@ -33,7 +87,20 @@ class A2CLearner:
                  max_loss_threshold: float = 10.0,
                  use_advanced_network: bool = True,
                  use_curriculum: bool = True,
-                 use_priority_replay: bool = True):
+                 use_priority_replay: bool = True,
+                 threat_aux_enabled: bool = False,
+                 use_torch_compile: bool = False,
+                 sync_interval: int = 4,
+                 use_amp: bool = False):
+        
+        # The model is small and shares the host with live inference; the
+        # default one-thread-per-core pools only oversubscribe the CPU.
+        torch.set_num_threads(max(1, int(os.environ.get("A2C_NUM_THREADS", "2"))))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set before any inter-op parallel work has started
+            pass
         
         self.model_path = model_path
         self.gamma = gamma
@@ -41,11 +108,18 @@ class A2CLearner:
         self.entropy_coef = entropy_coef
         self.max_grad_norm = max_grad_norm
         self.max_loss_threshold = max_loss_threshold
+        # Copy training weights to the live model every N training iterations
+        self.sync_interval = max(1, sync_interval)
         
         # Configuration flags
         self.use_advanced_network = use_advanced_network
         self.use_curriculum = use_curriculum
         self.use_priority_replay = use_priority_replay
+        # Threat targets are all-zero until real threat analysis lands, so the
+        # threat head and its loss are skipped unless explicitly enabled.
+        self.threat_aux_enabled = threat_aux_enabled
+        
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         
         # ENHANCED: Use advanced network architecture
         if use_advanced_network:
@@ -57,12 +131,63 @@ class A2CLearner:
             self.model_training = PolicyValueNet()
             self.model_live = PolicyValueNet()
         
-        self.optimizer = optim.Adam(self.model_training.parameters(), lr=learning_rate)
+        self.model_training.to(self.device)
+        self.model_live.to(self.device)
+        
+        # Matching (live, training) tensor pairs for the in-place sync_models copy
+        self._sync_pairs = list(zip(
+            list(self.model_live.parameters()) + list(self.model_live.buffers()),
+            list(self.model_training.parameters()) + list(self.model_training.buffers())
+        ))
+        
+        # Optional Inductor-compiled view of the training model, used only for
+        # the training forward. "default" mode avoids CUDA graphs, which break
+        # on the variable batch sizes seen here. model_live stays eager so
+        # syncing and state_dict transfer are unchanged.
+        self._compiled_train = self.model_training
+        self._a2c_loss_fn = _a2c_losses
+        if use_torch_compile:
+            if hasattr(torch, "compile"):
+                self._compiled_train = torch.compile(self.model_training, mode="default", fullgraph=False)
+                # The loss math has no control flow, so it fuses as one graph
+                self._a2c_loss_fn = torch.compile(_a2c_losses, fullgraph=True, dynamic=False)
+            else:
+                print("WARNING: torch.compile is not available in this PyTorch build; training eagerly")
+        
+        # Outputs of the last training forward, checked by _check_model_health
+        self._last_policy_logits = None
+        self._last_values = None
+        
+        # Fused Adam applies every parameter update in one CUDA kernel
+        self.optimizer = optim.Adam(
+            self.model_training.parameters(), lr=learning_rate,
+            fused=self.device.type == "cuda"
+        )
+        
+        # Mixed precision (opt-in, CUDA only); expect small numerical
+        # deviations from FP32 training. BF16 keeps FP32's exponent range, so
+        # the gradient scaler is only active if amp_dtype is switched to FP16.
+        self.use_amp = use_amp and self.device.type == "cuda"
+        self.amp_dtype = torch.bfloat16
+        self.scaler = torch.amp.GradScaler(
+            "cuda", enabled=self.use_amp and self.amp_dtype == torch.float16
+        )
         
         # Learning control
         self.learning_enabled = True
         self.learning_paused = False
         
+        # Background checkpoint writer (see save_model)
+        self._save_thread = None
+        self._save_lock = threading.Lock()
+        
+        # Background replay sampler (see start_prefetch). Holds encoded
+        # host-side microbatches so sampling overlaps with training.
+        self.prefetch_queue = queue.Queue(maxsize=2)
+        self._prefetch_thread = None
+        self._prefetch_batch_size = None
+        self._prefetch_stop = threading.Event()
+        
         # Load existing model if available
         self._load_model()
         
@@ -78,22 +203,24 @@ class A2CLearner:
         # NEW: AI evaluator
         self.evaluator = AIEvaluator()
         
-        # Training statistics
+        # Training statistics (histories are bounded so long runs don't leak)
         self.training_steps = 0
-        self.total_loss_history = []
-        self.policy_loss_history = []
-        self.value_loss_history = []
-        self.avg_loss_window = []
+        self.total_loss_history = deque(maxlen=10000)
+        self.policy_loss_history = deque(maxlen=10000)
+        self.value_loss_history = deque(maxlen=10000)
+        self.avg_loss_window = _RollingWindow(maxlen=100)
+        self.policy_loss_window = _RollingWindow(maxlen=100)
+        self.value_loss_window = _RollingWindow(maxlen=100)
         
         # NEW: Auxiliary loss tracking
-        self.material_loss_history = []
-        self.threat_loss_history = []
+        self.material_loss_history = deque(maxlen=10000)
+        self.threat_loss_history = deque(maxlen=10000)
         
     def _load_model(self):
         """Load model from checkpoint if it exists."""
         if os.path.exists(self.model_path):
             try:
-                checkpoint = torch.load(self.model_path, weights_only=False)
+                checkpoint = torch.load(self.model_path, map_location=self.device, weights_only=False)
                 # Load into both training and live models
                 try:
                     self.model_training.load_state_dict(checkpoint['model_state_dict'])
@@ -118,52 +245,93 @@ class A2CLearner:
             self.model_training.train()
             self.model_live.eval()
     
-    def save_model(self):
-        """Save model checkpoint (saves the training model)."""
+    def save_model(self, wait: bool = False):
+        """
+        Save model checkpoint (saves the training model).
+        
+        The state dicts are snapshotted to CPU on the calling thread, then
+        serialized to disk on a background thread so training is not blocked
+        on pickling and disk I/O.
+        
+        Args:
+            wait: Block until the checkpoint has been written (use on shutdown)
+        """
+        # Only one save in flight: finish the previous one before snapshotting
+        if self._save_thread is not None and self._save_thread.is_alive():
+            self._save_thread.join()
+        
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        torch.save({
-            'model_state_dict': self.model_training.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
+        payload = {
+            'model_state_dict': _cpu_snapshot(self.model_training.state_dict()),
+            'optimizer_state_dict': _cpu_snapshot(self.optimizer.state_dict()),
             'training_steps': self.training_steps,
-            'policy_loss': np.mean(self.policy_loss_history[-100:]) if self.policy_loss_history else 0,
-            'value_loss': np.mean(self.value_loss_history[-100:]) if self.value_loss_history else 0,
-        }, self.model_path)
-        print(f"Model saved to {self.model_path}")
+            'policy_loss': self.policy_loss_window.mean(),
+            'value_loss': self.value_loss_window.mean(),
+        }
+        
+        self._save_thread = threading.Thread(
+            target=self._write_checkpoint,
+            args=(payload, self.model_path),
+            name="checkpoint-writer"
+        )
+        self._save_thread.start()
+        
+        if wait:
+            self._save_thread.join()
+    
+    def _write_checkpoint(self, payload, path):
+        """
+        Serialize a checkpoint snapshot to disk (runs on the writer thread).
+        
+        Writes to a temporary file and atomically renames it over `path`, so
+        the API's checkpoint hot-reload never sees a half-written file.
+        """
+        tmp_path = f"{path}.tmp"
+        with self._save_lock:
+            try:
+                torch.save(payload, tmp_path, _use_new_zipfile_serialization=True)
+                os.replace(tmp_path, path)
+                print(f"Model saved to {path}")
+            except Exception as e:
+                print(f"WARNING: Could not save model: {e}")
+                if os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
     
     def _check_model_health(self) -> bool:
         """
         HARDENING: Check if the training model is healthy before syncing.
         Prevents corrupted models from affecting inference.
         
+        Checks that every parameter and buffer is finite, and that the
+        outputs of the last training forward (cached in _compute_losses)
+        are finite and in range. No extra forward pass is run.
+        
         Returns:
             True if model passes health checks, False otherwise
         """
         try:
-            self.model_training.eval()
-            
-            # Create test input (dummy 10x10 board)
-            test_input = torch.randn(1, 5, 10, 10)
-            
-            with torch.no_grad():
-                policy, value = self.model_training(test_input)
-                
-                # Check for NaNs
-                if torch.isnan(policy).any() or torch.isnan(value).any():
-                    print("WARNING: Model health check FAILED: NaN detected")
-                    return False
-                
-                # Check if policy sums to ~1
-                policy_sum = policy.sum().item()
-                if not (0.99 < policy_sum < 1.01):
-                    print(f"WARNING: Model health check FAILED: Policy sum = {policy_sum}")
+            with torch.inference_mode():
+                tensors = list(self.model_training.parameters()) + list(self.model_training.buffers())
+                if not torch.stack([torch.isfinite(t).all() for t in tensors]).all().item():
+                    print("WARNING: Model health check FAILED: NaN/Inf in model weights")
                     return False
                 
-                # Check if value is in valid range
-                if not (-1.1 < value.item() < 1.1):
-                    print(f"WARNING: Model health check FAILED: Value = {value.item()}")
-                    return False
+                if self._last_policy_logits is not None and self._last_values is not None:
+                    # Check for NaNs
+                    if not (torch.isfinite(self._last_policy_logits).all() and
+                            torch.isfinite(self._last_values).all()):
+                        print("WARNING: Model health check FAILED: NaN detected")
+                        return False
+                    
+                    # Check if value is in valid range
+                    max_abs_value = self._last_values.abs().max().item()
+                    if not max_abs_value < 1.1:
+                        print(f"WARNING: Model health check FAILED: Value = {max_abs_value}")
+                        return False
             
-            self.model_training.train()
             return True
             
         except Exception as e:
@@ -180,14 +348,22 @@ class A2CLearner:
             print("ERROR: Skipping model sync due to failed health check")
             return False
         
-        # Sync weights
-        self.model_live.load_state_dict(self.model_training.state_dict())
+        # Sync weights (parameters and BN running stats) in place, without
+        # building a state_dict
+        with torch.no_grad():
+            for live_tensor, train_tensor in self._sync_pairs:
+                live_tensor.copy_(train_tensor)
         self.model_live.eval()
         print("SUCCESS: Models synced successfully")
         return True
     
     def get_live_model(self):
-        """Get the model that should be used for inference."""
+        """
+        Get the model that should be used for inference.
+        
+        Callers should run it under torch.inference_mode(); the forward is
+        pure inference and needs no autograd bookkeeping.
+        """
         return self.model_live
     
     def pause_learning(self):
@@ -205,36 +381,28 @@ class A2CLearner:
         Compute n-step returns and advantages using GAE (Generalized Advantage Estimation).
         
         Args:
-            rewards: List of rewards
-            dones: List of done flags
-            values: List of state values
-            next_values: List of next state values
+            rewards: Tensor of rewards, shape (B,)
+            dones: Bool tensor of done flags, shape (B,)
+            values: Tensor of state values, shape (B,)
+            next_values: Tensor of next state values, shape (B,)
             
         Returns:
             returns: Discounted returns
             advantages: Advantages for policy gradient
-        """
-        returns = []
-        advantages = []
-        
-        # Calculate returns and advantages
-        for i in range(len(rewards)):
-            if dones[i]:
-                # Terminal state
-                ret = rewards[i]
-                adv = rewards[i] - values[i]
-            else:
-                # Non-terminal state
-                ret = rewards[i] + self.gamma * next_values[i]
-                adv = rewards[i] + self.gamma * next_values[i] - values[i]
             
-            returns.append(ret)
-            advantages.append(adv)
-        
-        return torch.tensor(returns, dtype=torch.float32), \
-               torch.tensor(advantages, dtype=torch.float32)
+        Both outputs are training targets, so values and next_values are
+        detached here and no gradient flows back through them.
+        """
+        values = values.detach().float()
+        next_values = next_values.detach().float()
+        
+        # Terminal states do not bootstrap from the next state's value
+        not_done = (~dones).float()
+        returns = rewards + self.gamma * next_values * not_done
+        advantages = returns - values
+        return returns, advantages
     
-    def train_on_trajectories(self, batch_size: int = 32):
+    def train_on_trajectories(self, batch_size: int = 32, accumulation_steps: int = 4):
         """
         ENHANCED: Train the model on a batch of trajectories.
         
@@ -243,9 +411,13 @@ class A2CLearner:
         - Curriculum-aware training
         - Auxiliary task losses
         - Enhanced statistics
+        - Gradient accumulation over several microbatches
         
         Args:
-            batch_size: Number of trajectories to sample for training
+            batch_size: Number of trajectories per microbatch
+            accumulation_steps: Microbatches whose gradients are accumulated
+                before a single optimizer step (effective batch is
+                batch_size * accumulation_steps)
             
         Returns:
             Training statistics dictionary
@@ -255,178 +427,81 @@ class A2CLearner:
             stats = self.replay_buffer.get_stats()
             self.curriculum.update_games_count(stats['total_games'])
         
-        # ENHANCED: Use priority sampling if enabled
-        if self.use_priority_replay:
-            trajectories = self.replay_buffer.get_prioritized_trajectories(
-                batch_size=batch_size,
-                player="black",
-                temperature=0.8  # Moderate prioritization
-            )
-        else:
-            # Fallback to mixed sampling
-            trajectories = self.replay_buffer.get_mixed_trajectories(
-                batch_size=batch_size,
-                recent_ratio=0.8,
-                player="black"
-            )
-        
-        if len(trajectories) < batch_size:
-            print(f"Not enough trajectories for training ({len(trajectories)}/{batch_size})")
-            return None
-        
-        # Prepare batch data
-        states = []
-        actions = []
-        rewards = []
-        next_states = []
-        dones = []
-        heuristic_scores = []
+        # Sample every microbatch up front so a short buffer never leaves
+        # partially accumulated gradients behind
+        microbatches = []
+        for _ in range(accumulation_steps):
+            microbatch = self._next_microbatch(batch_size)
+            if microbatch is None:
+                return None
+            microbatches.append(microbatch)
         
-        for traj in trajectories:
-            states.append(encode_state(traj['board_state']))
-            
-            # Encode action
-            action_dict = traj['action']
-            action_idx = encode_move(
-                action_dict['from'][0], action_dict['from'][1],
-                action_dict['to'][0], action_dict['to'][1]
-            )
-            actions.append(action_idx)
-            
-            rewards.append(traj['reward'])
-            next_states.append(encode_state(traj['next_state']))
-            dones.append(traj['done'])
-            heuristic_scores.append(traj.get('heuristic_score', 0.0))
-        
-        # Convert to tensors
-        states_tensor = torch.tensor(np.array(states), dtype=torch.float32)
-        actions_tensor = torch.tensor(actions, dtype=torch.long)
-        rewards_tensor = torch.tensor(rewards, dtype=torch.float32)
-        next_states_tensor = torch.tensor(np.array(next_states), dtype=torch.float32)
-        dones_tensor = torch.tensor(dones, dtype=torch.bool)
-        h_scores_tensor = torch.tensor(heuristic_scores, dtype=torch.float32)
-        
-        # Forward pass (with auxiliary outputs if advanced network)
         self.model_training.train()
+        self.optimizer.zero_grad(set_to_none=True)
         
-        if self.use_advanced_network:
-            # Get auxiliary predictions
-            policy_logits, values, material_preds, threat_maps = self.model_training(
-                states_tensor, 
-                return_aux=True
-            )
-            _, next_values, _, _ = self.model_training(next_states_tensor, return_aux=True)
-        else:
-            policy_logits, values = self.model_training(states_tensor)
-            _, next_values = self.model_training(next_states_tensor)
-        
-        # Compute returns and advantages
-        returns, advantages = self.compute_returns(
-            rewards_tensor.tolist(),
-            dones_tensor.tolist(),
-            values.squeeze().tolist(),
-            next_values.squeeze().tolist()
-        )
-        
-        # Normalize advantages
-        advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
-        
-        # === POLICY LOSS ===
-        log_probs = torch.log(policy_logits + 1e-8)
-        selected_log_probs = log_probs[range(len(actions)), actions_tensor]
-        policy_loss = -(selected_log_probs * advantages).mean()
-        
-        # === VALUE LOSS ===
-        value_loss = nn.MSELoss()(values.squeeze(), returns)
-        
-        # === ENTROPY BONUS ===
-        entropy = -(policy_logits * log_probs).sum(dim=1).mean()
-        
-        # === AUXILIARY LOSSES (if advanced network) ===
-        material_loss = torch.tensor(0.0)
-        threat_loss = torch.tensor(0.0)
-        
-        if self.use_advanced_network:
-            # Material classification loss
-            try:
-                material_targets = self._compute_material_targets(states_tensor, trajectories)
-                if material_targets is not None:
-                    material_loss = nn.CrossEntropyLoss()(material_preds, material_targets)
-            except Exception as e:
-                print(f"Warning: Material loss computation failed: {e}")
+        step_metrics = []
+        for trajectories, host_batch in microbatches:
+            batch = self._batch_to_device(host_batch)
+            losses = self._compute_losses(batch, trajectories)
             
-            # Threat detection loss (simplified - just check if under threat)
-            try:
-                threat_targets = self._compute_threat_targets(states_tensor, trajectories)
-                if threat_targets is not None:
-                    threat_loss = nn.BCELoss()(threat_maps.squeeze(), threat_targets)
-            except Exception as e:
-                print(f"Warning: Threat loss computation failed: {e}")
-        
-        # === DISTILLATION LOSS ===
-        # Force the network to learn from the heuristic AI evaluation (Teacher-Student)
-        distillation_loss = nn.MSELoss()(values.squeeze(), h_scores_tensor.to(values.device))
-        
-        # === TOTAL LOSS ===
-        total_loss = (
-            policy_loss + 
-            self.value_loss_coef * value_loss - 
-            self.entropy_coef * entropy +
-            0.1 * material_loss +
-            0.1 * threat_loss +
-            0.5 * distillation_loss  # Knowledge Distillation bias
-        )
-        
-        # Backward pass
-        self.optimizer.zero_grad()
-        total_loss.backward()
-        
-        # Gradient clipping
+            # Backward pass (the scaler is a pass-through unless training in FP16)
+            self.scaler.scale(losses['total_loss'] / accumulation_steps).backward()
+            
+            step_metrics.append(torch.stack([
+                losses['total_loss'], losses['policy_loss'], losses['value_loss'],
+                losses['entropy'], losses['material_loss'], losses['threat_loss'],
+                losses['distill_loss'], losses['advantage_accuracy']
+            ]).detach().float())
+        
+        # Gradient clipping (on unscaled gradients)
+        self.scaler.unscale_(self.optimizer)
         nn.utils.clip_grad_norm_(self.model_training.parameters(), self.max_grad_norm)
         
-        self.optimizer.step()
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
+        
+        # Pull every scalar metric (averaged over microbatches) off the device
+        # in a single copy instead of one synchronizing .item() per value
+        (total_loss_val, policy_loss_val, value_loss_val, entropy_val,
+         material_loss_val, threat_loss_val, distill_loss_val,
+         advantage_accuracy_val) = torch.stack(step_metrics).mean(dim=0).cpu().tolist()
         
         # Update statistics
         self.training_steps += 1
-        self.total_loss_history.append(total_loss.item())
-        self.policy_loss_history.append(policy_loss.item())
-        self.value_loss_history.append(value_loss.item())
-        self.avg_loss_window.append(total_loss.item())
+        self.total_loss_history.append(total_loss_val)
+        self.policy_loss_history.append(policy_loss_val)
+        self.value_loss_history.append(value_loss_val)
+        self.avg_loss_window.append(total_loss_val)
+        self.policy_loss_window.append(policy_loss_val)
+        self.value_loss_window.append(value_loss_val)
         
         if self.use_advanced_network:
-            self.material_loss_history.append(material_loss.item())
-            self.threat_loss_history.append(threat_loss.item())
-        
-        # Keep only last 100 losses for averaging
-        if len(self.avg_loss_window) > 100:
-            self.avg_loss_window.pop(0)
+            self.material_loss_history.append(material_loss_val)
+            self.threat_loss_history.append(threat_loss_val)
         
         # Update evaluator metrics
-        policy_entropy = entropy.item()
-        value_error = value_loss.item()
-        advantage_accuracy = (advantages.sign() == returns.sign()).float().mean().item()
-        self.evaluator.update_training_metrics(policy_entropy, value_error, advantage_accuracy)
+        self.evaluator.update_training_metrics(entropy_val, value_loss_val, advantage_accuracy_val)
         
         # HARDENING: Kill switch - pause learning if loss explodes
-        avg_recent_loss = np.mean(self.avg_loss_window)
+        avg_recent_loss = self.avg_loss_window.mean()
         if avg_recent_loss > self.max_loss_threshold:
             print(f"WARNING: Average loss ({avg_recent_loss:.2f}) exceeds threshold ({self.max_loss_threshold})")
             self.pause_learning()
         
         # Build stats dictionary
         stats = {
-            'total_loss': total_loss.item(),
-            'policy_loss': policy_loss.item(),
-            'value_loss': value_loss.item(),
-            'entropy': entropy.item(),
+            'total_loss': total_loss_val,
+            'policy_loss': policy_loss_val,
+            'value_loss': value_loss_val,
+            'entropy': entropy_val,
             'training_steps': self.training_steps,
             'avg_recent_loss': avg_recent_loss
         }
         
         if self.use_advanced_network:
-            stats['material_loss'] = material_loss.item()
-            stats['threat_loss'] = threat_loss.item()
-            stats['distill_loss'] = distillation_loss.item()
+            stats['material_loss'] = material_loss_val
+            stats['threat_loss'] = threat_loss_val
+            stats['distill_loss'] = distill_loss_val
         
         if self.curriculum:
             stage_info = self.curriculum.get_stage_info()
@@ -435,19 +510,249 @@ class A2CLearner:
         
         return stats
     
-    def _compute_material_targets(self, states_tensor, trajectories):
-        """Compute material balance targets for auxiliary loss."""
+    def _sample_microbatch(self, batch_size: int):
+        """
+        Sample and encode one microbatch from the replay buffer.
+        
+        Returns:
+            (trajectories, host_batch), or None if the buffer can't fill it.
+            Rows are decoded straight into the host arrays, and
+            `trajectories` is the (B, 10, 10) board-code array (enough for
+            the auxiliary targets).
+        """
+        pin_memory = self.device.type == "cuda"
+        
+        # ENHANCED: Use priority sampling if enabled
+        if self.use_priority_replay:
+            host_batch = self.replay_buffer.get_prioritized_batch(
+                batch_size=batch_size,
+                player="black",
+                temperature=0.8,  # Moderate prioritization
+                pin_memory=pin_memory
+            )
+        else:
+            # Fallback to mixed sampling
+            host_batch = self.replay_buffer.get_training_batch(
+                batch_size=batch_size,
+                recent_ratio=0.8,
+                player="black",
+                pin_memory=pin_memory
+            )
+        if host_batch is None:
+            return None
+        return host_batch.pop('boards'), host_batch
+    
+    def _next_microbatch(self, batch_size: int):
+        """
+        Return the next (trajectories, host_batch) pair, or None if the
+        replay buffer cannot fill a batch yet.
+        
+        Uses the prefetch queue when the background sampler is running for
+        this batch size, otherwise samples and encodes synchronously. A
+        prefetch timeout also falls back to a synchronous sample, so a slow
+        sampler thread doesn't fail the step.
+        """
+        if (self._prefetch_thread is not None and self._prefetch_thread.is_alive()
+                and self._prefetch_batch_size == batch_size):
+            try:
+                return self.prefetch_queue.get(timeout=5.0)
+            except queue.Empty:
+                print("WARNING: Prefetch queue empty, sampling synchronously")
+        
+        item = self._sample_microbatch(batch_size)
+        if item is None:
+            print(f"Not enough trajectories for training (need {batch_size})")
+        return item
+    
+    def start_prefetch(self, batch_size: int):
+        """Start the background sampler thread that fills prefetch_queue."""
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        self._prefetch_batch_size = batch_size
+        self._prefetch_stop.clear()
+        self._prefetch_thread = threading.Thread(
+            target=self._sample_loop, args=(batch_size,),
+            name="replay-prefetch", daemon=True
+        )
+        self._prefetch_thread.start()
+    
+    def stop_prefetch(self):
+        """Stop the background sampler and drop any queued microbatches."""
+        self._prefetch_stop.set()
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join(timeout=5.0)
+        self._prefetch_thread = None
+        while True:
+            try:
+                self.prefetch_queue.get_nowait()
+            except queue.Empty:
+                break
+    
+    def _sample_loop(self, batch_size: int):
+        """Producer: sample and encode microbatches ahead of the training step."""
+        while not self._prefetch_stop.is_set():
+            try:
+                item = self._sample_microbatch(batch_size)
+                if item is None:
+                    self._prefetch_stop.wait(1.0)
+                    continue
+            except Exception as e:
+                print(f"WARNING: Prefetch sampling failed: {e}")
+                self._prefetch_stop.wait(1.0)
+                continue
+            
+            # Block while the queue is full, but keep checking for shutdown
+            while not self._prefetch_stop.is_set():
+                try:
+                    self.prefetch_queue.put(item, timeout=1.0)
+                    break
+                except queue.Full:
+                    continue
+    
+    def _batch_to_device(self, host_batch):
+        """Move an encoded host batch to the training device."""
+        if self.device.type != "cuda":
+            return {k: torch.from_numpy(v) for k, v in host_batch.items()}
+        # Replay-buffer batches are already pinned; pin anything else
+        batch = {}
+        for k, v in host_batch.items():
+            host_tensor = torch.from_numpy(v)
+            if not host_tensor.is_pinned():
+                host_tensor = host_tensor.pin_memory()
+            batch[k] = host_tensor.to(self.device, non_blocking=True)
+        return batch
+    
+    def _compute_losses(self, batch, trajectories):
+        """
+        Forward one microbatch and compute every loss term.
+        
+        Returns:
+            Dictionary of scalar tensors (still attached to the graph)
+        """
+        states_tensor = batch['states']
+        actions_tensor = batch['actions']
+        
+        # Mixed precision: BF16 autocast on CUDA when use_amp is set
+        with torch.autocast(device_type=self.device.type, dtype=self.amp_dtype, enabled=self.use_amp):
+            # States and next states share one (2B, ...) forward pass
+            batch_len = states_tensor.size(0)
+            combined = torch.cat([states_tensor, batch['next_states']], dim=0)
+            
+            if self.use_advanced_network:
+                # Get auxiliary predictions
+                policy_all, values_all, material_all, threat_all = self._compiled_train(
+                    combined,
+                    return_aux=True,
+                    compute_threat=self.threat_aux_enabled
+                )
+                material_preds = material_all[:batch_len]
+                threat_maps = threat_all[:batch_len] if threat_all is not None else None
+            else:
+                policy_all, values_all = self._compiled_train(combined)
+            
+            policy_logits = policy_all[:batch_len]
+            values = values_all[:batch_len]
+            next_values = values_all[batch_len:]
+            self._last_policy_logits = policy_logits.detach()
+            self._last_values = values.detach()
+            
+            # Compute returns and advantages
+            returns, advantages = self.compute_returns(
+                batch['rewards'],
+                batch['dones'],
+                values.squeeze(-1),
+                next_values.squeeze(-1)
+            )
+            
+            # Normalize advantages
+            advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+            
+            # === POLICY / VALUE LOSS + ENTROPY BONUS ===
+            policy_loss, value_loss, entropy = self._a2c_loss_fn(
+                policy_logits, values, actions_tensor, advantages, returns
+            )
+            
+            # === AUXILIARY LOSSES (if advanced network) ===
+            material_loss = values.new_zeros((), dtype=torch.float32)
+            threat_loss = values.new_zeros((), dtype=torch.float32)
+            
+            if self.use_advanced_network:
+                # Material classification loss
+                try:
+                    material_targets = self._compute_material_targets(trajectories)
+                    if material_targets is not None:
+                        material_loss = F.cross_entropy(material_preds, material_targets)
+                except Exception as e:
+                    print(f"Warning: Material loss computation failed: {e}")
+                
+                # Threat detection loss (simplified - just check if under threat)
+                if self.threat_aux_enabled:
+                    try:
+                        threat_targets = self._compute_threat_targets(trajectories)
+                        if threat_targets is not None:
+                            # BCE is not autocast-safe; evaluate it in FP32
+                            with torch.autocast(device_type=self.device.type, enabled=False):
+                                threat_loss = F.binary_cross_entropy(threat_maps.float().squeeze(1), threat_targets)
+                    except Exception as e:
+                        print(f"Warning: Threat loss computation failed: {e}")
+            
+            # === DISTILLATION LOSS ===
+            # Force the network to learn from the heuristic AI evaluation (Teacher-Student)
+            distillation_loss = F.mse_loss(values.float().squeeze(-1), batch['heuristic_scores'])
+            
+            # === TOTAL LOSS ===
+            total_loss = (
+                policy_loss + 
+                self.value_loss_coef * value_loss - 
+                self.entropy_coef * entropy +
+                0.1 * material_loss +
+                0.1 * threat_loss +
+                0.5 * distillation_loss  # Knowledge Distillation bias
+            )
+        
+        return {
+            'total_loss': total_loss,
+            'policy_loss': policy_loss,
+            'value_loss': value_loss,
+            'entropy': entropy,
+            'material_loss': material_loss,
+            'threat_loss': threat_loss,
+            'distill_loss': distillation_loss,
+            'advantage_accuracy': (advantages.sign() == returns.sign()).float().mean(),
+        }
+    
+    def _compute_material_targets(self, trajectories):
+        """
+        Compute material balance targets for auxiliary loss.
+        
+        Accepts trajectory dicts or a (B, 10, 10) board-code array.
+        """
         try:
+            if isinstance(trajectories, np.ndarray):
+                codes = trajectories.reshape(len(trajectories), -1)
+                black_count = np.count_nonzero(codes >= BLACK_MAN, axis=1)
+                red_count = np.count_nonzero((codes > EMPTY) & (codes < BLACK_MAN), axis=1)
+                # Classify: 0=behind, 1=even, 2=ahead
+                targets = np.ones(len(codes), dtype=np.int64)
+                targets[black_count < red_count - 1] = 0
+                targets[black_count > red_count + 1] = 2
+                return torch.from_numpy(targets).to(self.device)
+            
             targets = []
             for traj in trajectories:
                 # Count pieces (simplified)
                 board = traj['board_state']
-                if isinstance(board, str):
-                    import json
-                    board = json.loads(board)
-                
-                black_count = sum(1 for row in board for cell in row if cell and cell.get('color') == 'black')
-                red_count = sum(1 for row in board for cell in row if cell and cell.get('color') == 'red')
+                if isinstance(board, np.ndarray):
+                    # Packed piece codes from the replay buffer
+                    black_count = int(np.count_nonzero(board >= BLACK_MAN))
+                    red_count = int(np.count_nonzero((board > EMPTY) & (board < BLACK_MAN)))
+                else:
+                    if isinstance(board, str):
+                        import json
+                        board = json.loads(board)
+                    
+                    black_count = sum(1 for row in board for cell in row if cell and cell.get('color') == 'black')
+                    red_count = sum(1 for row in board for cell in row if cell and cell.get('color') == 'red')
                 
                 # Classify: 0=behind, 1=even, 2=ahead
                 if black_count < red_count - 1:
@@ -457,17 +762,17 @@ class A2CLearner:
                 else:
                     targets.append(1)  # even
             
-            return torch.tensor(targets, dtype=torch.long)
+            return torch.tensor(targets, dtype=torch.long, device=self.device)
         except:
             return None
     
-    def _compute_threat_targets(self, states_tensor, trajectories):
+    def _compute_threat_targets(self, trajectories):
         """Compute threat map targets (simplified)."""
         try:
             # For now, return zeros (no threats)
             # In full implementation, would analyze board for actual threats
             batch_size = len(trajectories)
-            return torch.zeros((batch_size, 10, 10), dtype=torch.float32)
+            return torch.zeros((batch_size, 10, 10), dtype=torch.float32, device=self.device)
         except:
             return None
     
@@ -487,7 +792,7 @@ class A2CLearner:
         # Handle graceful shutdown
         def signal_handler(sig, frame):
             print("\n[SHUTDOWN] Received shutdown signal. Saving model...")
-            self.save_model()
+            self.save_model(wait=True)
             raise SystemExit(0)
         
         signal.signal(signal.SIGINT, signal_handler)
@@ -495,6 +800,10 @@ class A2CLearner:
         
         print("Starting A2C training loop...")
         print(f"Training interval: {training_interval}s, Batch size: {batch_size}")
+        
+        # Sample and encode the next microbatches while the current step trains
+        self.start_prefetch(batch_size)
+        
         iteration = 0
         consecutive_errors = 0
         max_consecutive_errors = 5
@@ -525,13 +834,17 @@ class A2CLearner:
                         print(f"  Entropy: {train_stats['entropy']:.4f}")
                         print(f"  Avg recent loss: {train_stats.get('avg_recent_loss', 0):.4f}")
                         
-                        # CRITICAL: Sync models after successful training
-                        if self.sync_models():
-                            # Save model periodically (only after successful sync)
-                            if iteration % save_interval == 0:
-                                self.save_model()
-                        else:
-                            print("WARNING: Model sync failed, not saving checkpoint")
+                        # CRITICAL: Sync models after successful training. Syncs
+                        # are amortized over sync_interval iterations, but a save
+                        # iteration always syncs so checkpoints stay health-checked.
+                        save_due = iteration % save_interval == 0
+                        if save_due or iteration % self.sync_interval == 0:
+                            if self.sync_models():
+                                # Save model periodically (only after successful sync)
+                                if save_due:
+                                    self.save_model()
+                            else:
+                                print("WARNING: Model sync failed, not saving checkpoint")
                 else:
                     print(f"Waiting for more data... ({stats['total_trajectories']}/{batch_size} trajectories)")
                 
@@ -540,7 +853,7 @@ class A2CLearner:
                 
             except KeyboardInterrupt:
                 print("\nTraining interrupted by user. Saving model...")
-                self.save_model()
+                self.save_model(wait=True)
                 break
             except SystemExit:
                 # Graceful shutdown from signal handler
@@ -555,13 +868,15 @@ class A2CLearner:
                     print(f"ERROR: Too many consecutive errors ({max_consecutive_errors}). Stopping training loop.")
                     print("Saving current model state before exit...")
                     try:
-                        self.save_model()
+                        self.save_model(wait=True)
                     except:
                         print("WARNING: Could not save model")
                     break
                 
                 # Wait before retrying
                 time.sleep(training_interval)
+        
+        self.stop_prefetch()
 
 
 def process_finished_games():
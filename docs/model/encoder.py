@@ -10,7 +10,103 @@ def _get_playable_squares(board_size: int = 10):
                 playable_squares.append((row, col))
     return playable_squares
 
-def encode_state(board_state: str):
+# Playable squares of the default 10x10 board, computed once at import
+PLAYABLE = tuple(_get_playable_squares(10))
+SQ_TO_IDX = {sq: i for i, sq in enumerate(PLAYABLE)}
+SQUARES_COUNT = len(PLAYABLE)
+
+
+def _playable_lookup(board_size: int):
+    """Return (playable squares, square->index map) for a board size."""
+    if board_size == 10:
+        return PLAYABLE, SQ_TO_IDX
+    playable_squares = tuple(_get_playable_squares(board_size))
+    return playable_squares, {sq: i for i, sq in enumerate(playable_squares)}
+
+# Channel 4 of the encoded state: valid play squares (dark squares)
+DARK_MASK = (np.indices((10, 10)).sum(axis=0) & 1).astype(np.float32)
+
+# Compact per-square piece codes (int8): 0 = empty, otherwise channel + 1
+EMPTY, RED_MAN, RED_KING, BLACK_MAN, BLACK_KING = 0, 1, 2, 3, 4
+
+# (color, is_king) -> piece code
+_PIECE_CODE = {
+    ('red', False): RED_MAN,
+    ('red', True): RED_KING,
+    ('black', False): BLACK_MAN,
+    ('black', True): BLACK_KING,
+}
+
+try:
+    import numba
+except ImportError:  # optional dependency
+    numba = None
+
+
+def _encode_codes_numpy(codes: np.ndarray, out: np.ndarray):
+    """Scatter piece codes into channels 0-3 of `out` (already zeroed)."""
+    flat = codes.reshape(-1)
+    occupied = np.flatnonzero(flat)
+    out[flat[occupied] - 1, occupied // 10, occupied % 10] = 1.0
+
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True)
+    def _encode_codes_kernel(codes, out):
+        for row in range(10):
+            for col in range(10):
+                code = codes[row, col]
+                if code > 0:
+                    out[code - 1, row, col] = 1.0
+    
+    # Compile once at import so the first training step doesn't pay for it
+    _encode_codes_kernel(np.zeros((10, 10), dtype=np.int8), np.zeros((5, 10, 10), dtype=np.float32))
+else:
+    _encode_codes_kernel = _encode_codes_numpy
+
+
+def board_to_codes(board_state) -> np.ndarray:
+    """
+    Convert a board (JSON string or nested list) into a (10, 10) int8 array
+    of piece codes (EMPTY, RED_MAN, RED_KING, BLACK_MAN, BLACK_KING).
+    A board that is already a code array is returned as is.
+    """
+    if isinstance(board_state, np.ndarray):
+        return board_state
+    
+    try:
+        board = json.loads(board_state)
+    except:
+        # If board_state is already a list/dict, use it directly
+        board = board_state
+    
+    return np.fromiter(
+        (EMPTY if piece is None else _PIECE_CODE.get((piece.get('color'), bool(piece.get('king', False))), EMPTY)
+         for row in board[:10] for piece in row[:10]),
+        dtype=np.int8, count=100
+    ).reshape(10, 10)
+
+
+def encode_codes(codes: np.ndarray, out: np.ndarray = None):
+    """
+    Encode a (10, 10) int8 piece-code board into the (5, 10, 10) network
+    planes (see encode_state). Uses a Numba kernel when numba is installed.
+    """
+    if out is None:
+        state_tensor = np.zeros((5, 10, 10), dtype=np.float32)
+    else:
+        state_tensor = out
+        state_tensor[:4] = 0.0
+    
+    _encode_codes_kernel(codes, state_tensor)
+    
+    # Mark valid play squares (dark squares)
+    state_tensor[4] = DARK_MASK
+    
+    return state_tensor
+
+
+def encode_state(board_state: str, out: np.ndarray = None):
     """
     Encode the 10x10 checkers board state into a tensor format for the neural network.
     
@@ -25,40 +121,11 @@ def encode_state(board_state: str):
     - Channel 2: Black pieces
     - Channel 3: Black kings
     - Channel 4: Valid play squares (dark squares on checkerboard)
-    """
-    try:
-        board = json.loads(board_state)
-    except:
-        # If board_state is already a list/dict, use it directly
-        board = board_state
-    
-    # Initialize tensor with 5 channels for 10x10 board
-    state_tensor = np.zeros((5, 10, 10), dtype=np.float32)
     
-    for row in range(10):
-        for col in range(10):
-            # Mark valid play squares (dark squares)
-            if (row + col) % 2 == 1:
-                state_tensor[4, row, col] = 1.0
-                
-            # Encode pieces
-            if board[row][col] is not None:
-                piece = board[row][col]
-                color = piece.get('color')
-                is_king = piece.get('king', False)
-                
-                if color == 'red':
-                    if is_king:
-                        state_tensor[1, row, col] = 1.0  # Red king
-                    else:
-                        state_tensor[0, row, col] = 1.0  # Red piece
-                elif color == 'black':
-                    if is_king:
-                        state_tensor[3, row, col] = 1.0  # Black king
-                    else:
-                        state_tensor[2, row, col] = 1.0  # Black piece
-    
-    return state_tensor
+    If `out` is given (a float32 array of shape (5, 10, 10)), the encoding is
+    written into it in place and `out` is returned.
+    """
+    return encode_codes(board_to_codes(board_state), out=out)
 
 
 def decode_move(move_index: int, board_size: int = 10):
@@ -70,7 +137,7 @@ def decode_move(move_index: int, board_size: int = 10):
     Updated encoding (v2): action index encodes (from_playable_square, to_playable_square).
     This supports flying kings because different landing squares map to different indices.
     """
-    playable_squares = _get_playable_squares(board_size)
+    playable_squares, _ = _playable_lookup(board_size)
     squares_count = len(playable_squares)
     if squares_count == 0:
         return None
@@ -96,15 +163,34 @@ def encode_move(from_row: int, from_col: int, to_row: int, to_col: int, board_si
     """
     Encode a move into a single index for the policy network output.
     """
-    playable_squares = _get_playable_squares(board_size)
-    squares_count = len(playable_squares)
+    _, sq_to_idx = _playable_lookup(board_size)
+    squares_count = len(sq_to_idx)
     if squares_count == 0:
         return -1
 
-    try:
-        from_square_idx = playable_squares.index((from_row, from_col))
-        to_square_idx = playable_squares.index((to_row, to_col))
-    except ValueError:
+    from_square_idx = sq_to_idx.get((from_row, from_col), -1)
+    to_square_idx = sq_to_idx.get((to_row, to_col), -1)
+    if from_square_idx < 0 or to_square_idx < 0:
         return -1
 
     return from_square_idx * squares_count + to_square_idx
+
+
+# Policy square index of each (row, col) of the 10x10 board, -1 off the playable squares
+_SQUARE_INDEX = np.full((10, 10), -1, dtype=np.int64)
+for _i, (_r, _c) in enumerate(PLAYABLE):
+    _SQUARE_INDEX[_r, _c] = _i
+
+
+def encode_moves(moves: np.ndarray) -> np.ndarray:
+    """
+    Vectorized encode_move for the 10x10 board: an (N, 4) array of
+    (from_row, from_col, to_row, to_col) rows -> (N,) int64 policy indices.
+    """
+    moves = np.asarray(moves, dtype=np.int64)
+    on_board = ((moves >= 0) & (moves < 10)).all(axis=1)
+    safe = np.where(on_board[:, None], moves, 0)
+    from_idx = _SQUARE_INDEX[safe[:, 0], safe[:, 1]]
+    to_idx = _SQUARE_INDEX[safe[:, 2], safe[:, 3]]
+    valid = on_board & (from_idx >= 0) & (to_idx >= 0)
+    return np.where(valid, from_idx * SQUARES_COUNT + to_idx, -1)
@@ -1,6 +1,397 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+try:
+    import intel_extension_for_pytorch as ipex
+except ImportError:  # optional dependency
+    ipex = None
+
+
+def _fuse_conv_bn_pairs(module, pairs):
+    """
+    Fold each (conv, bn) attribute pair of `module` into a single conv.
+    
+    The folded conv carries W' = W * gamma / sqrt(var + eps) and
+    b' = (b - mean) * gamma / sqrt(var + eps) + beta; the BN is replaced
+    with nn.Identity so forward() is unchanged. Eval mode only.
+    """
+    for conv_name, bn_name in pairs:
+        conv = getattr(module, conv_name)
+        bn = getattr(module, bn_name)
+        if isinstance(bn, nn.Identity):
+            continue  # already fused
+        setattr(module, conv_name, fuse_conv_bn_eval(conv, bn))
+        setattr(module, bn_name, nn.Identity())
+
+
+# Logit given to actions a sliced policy head dropped (see slice_policy_head).
+# Finite so that, if only dropped moves are legal, softmax is uniform over
+# them instead of NaN; stays finite in FP16 and after temperature scaling.
+_DROPPED_ACTION_LOGIT = -1e4
+
+
+def _slice_policy_head(model, action_indices):
+    """Shared implementation of slice_policy_head for both networks."""
+    fc = model.policy_fc
+    idx = torch.as_tensor(sorted(set(int(i) for i in action_indices)),
+                          dtype=torch.long, device=fc.weight.device)
+    sliced = nn.Linear(fc.in_features, idx.numel(), device=fc.weight.device, dtype=fc.weight.dtype)
+    with torch.no_grad():
+        sliced.weight.copy_(fc.weight[idx])
+        sliced.bias.copy_(fc.bias[idx])
+    model.policy_fc = sliced
+    model.policy_action_idx = idx
+    model._cuda_graphs.clear()
+    model.__dict__.pop('_scripted', None)
+    return model
+
+
+def _scatter_policy(logits, action_idx, num_actions):
+    """Expand (N, K) sliced-head logits back to the full (N, num_actions) action space."""
+    full = logits.new_full((logits.size(0), num_actions), _DROPPED_ACTION_LOGIT)
+    return full.index_copy_(1, action_idx, logits)
+
+
+class _CudaGraphForward:
+    """
+    A captured inference forward for one fixed input shape.
+    
+    Calling it copies the input into a static buffer and replays the graph,
+    replacing one kernel launch per layer with a single graph launch. The
+    returned (policy, value) tensors are static outputs that the next replay
+    overwrites, so consume or clone them before calling again.
+    
+    CPU inputs are staged through a pinned host buffer so the host-to-device
+    copy is a true async DMA ordered before the replay on the same stream.
+    """
+    
+    def __init__(self, model, example):
+        self.static_in = example.detach().clone()
+        self.host_buf = torch.empty_like(self.static_in, device='cpu').pin_memory()
+        # Marks when the last async copy out of host_buf has finished
+        self.copy_done = torch.cuda.Event()
+        
+        # Warm up on a side stream so lazy initialization isn't captured
+        side_stream = torch.cuda.Stream()
+        side_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(side_stream):
+            for _ in range(3):
+                model(self.static_in)
+        torch.cuda.current_stream().wait_stream(side_stream)
+        
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph):
+            self.static_policy, self.static_value = model(self.static_in)
+    
+    def __call__(self, state):
+        if state.is_cuda:
+            self.static_in.copy_(state, non_blocking=True)
+        else:
+            # Don't overwrite host_buf while the previous DMA may still read it
+            self.copy_done.synchronize()
+            self.host_buf.copy_(state)
+            self.static_in.copy_(self.host_buf, non_blocking=True)
+            self.copy_done.record()
+        self.graph.replay()
+        return self.static_policy, self.static_value
+
+
+def _action_probs_from_logits(logits, legal_moves=None, temperature=1.0):
+    """
+    softmax(logits / T) restricted to the legal moves.
+    
+    Equivalent to renormalizing p ** (1 / T) over the legal moves, but done in
+    log space: one scale, one masked fill and a single softmax. A row with no
+    legal move comes out all zeros.
+    
+    Args:
+        logits: Policy logits (batch, num_actions)
+        legal_moves: Legal move indices, or a prebuilt boolean legal mask of
+            shape (num_actions,) or (batch, num_actions) that callers can
+            cache per position
+        temperature: Sampling temperature
+    """
+    if temperature != 1.0:
+        logits = logits / temperature
+    
+    if legal_moves is not None:
+        if isinstance(legal_moves, torch.Tensor) and legal_moves.dtype == torch.bool:
+            legal_mask = legal_moves.to(logits.device)
+        else:
+            legal_mask = torch.zeros(logits.size(1), dtype=torch.bool, device=logits.device)
+            legal_mask[legal_moves] = True
+        # Finite fill: with -inf a row with no legal move would be all NaN.
+        # The zero fill after the softmax makes illegal moves exactly 0 and
+        # such a row all zeros (as the old multiply-and-renormalize did).
+        illegal = ~legal_mask
+        logits = logits.masked_fill(illegal, torch.finfo(logits.dtype).min)
+        return F.softmax(logits, dim=1).masked_fill_(illegal, 0.0)
+    
+    return F.softmax(logits, dim=1)
+
+
+# Batch sizes CUDA graphs are captured at for batch_action_probs; larger
+# inputs run ungraphed
+_GRAPH_BATCH_BUCKETS = (1, 8, 32, 64)
+
+
+def _batch_action_probs(model, states, legal_masks=None, temperature=1.0):
+    """Shared implementation of batch_action_probs for both networks."""
+    with torch.inference_mode():
+        n = states.size(0)
+        if model.use_cuda_graphs and states.is_cuda:
+            # Pad to a captured batch size so every call replays a graph
+            bucket = next((b for b in _GRAPH_BATCH_BUCKETS if b >= n), None)
+            if bucket is not None and bucket != n:
+                padding = states.new_zeros((bucket - n,) + tuple(states.shape[1:]))
+                states = torch.cat([states, padding], dim=0)
+        
+        policy_logits, _ = inference_forward(model, states)
+        return _action_probs_from_logits(policy_logits[:n], legal_masks, temperature)
+
+
+def _predict(model, state, legal_moves=None, temperature=1.0):
+    """Shared implementation of predict for both networks."""
+    with torch.inference_mode():
+        policy_logits, value = inference_forward(model, state)
+        return _action_probs_from_logits(policy_logits, legal_moves, temperature), value.clone()
+
+
+def _ipex_optimize(model):
+    """Shared implementation of ipex_optimize for both networks."""
+    model.eval()
+    if ipex is None:
+        print("WARNING: intel_extension_for_pytorch is not installed; skipping IPEX optimization")
+        return model
+    return ipex.optimize(model, dtype=torch.float32, conv_bn_folding=True,
+                         linear_bn_folding=True, inplace=True)
+
+
+def _compile_for_inference(model, example=None):
+    """Trace, freeze and optimize `model` for inference (see compile_for_inference)."""
+    model.eval()
+    if example is None:
+        param = next(model.parameters())
+        example = torch.zeros(1, 5, model.board_size, model.board_size,
+                              device=param.device, dtype=param.dtype)
+        if model.channels_last:
+            example = example.contiguous(memory_format=torch.channels_last)
+    
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, check_trace=False)
+        scripted = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        # Warm up so the profiling executor specializes before real traffic
+        for _ in range(2):
+            scripted(example)
+    
+    # Stored outside the module tree so it never appears in state_dict()
+    model.__dict__['_scripted'] = scripted
+    return scripted
+
+
+def inference_forward(model, state):
+    """
+    (policy logits, value) for an inference call.
+    
+    Replays a CUDA graph when the model opted in (use_cuda_graphs), is in
+    eval mode and lives on CUDA (CPU inputs are copied in through a pinned
+    staging buffer; outputs stay on the GPU); otherwise uses the frozen TorchScript
+    module from compile_for_inference() if there is one; otherwise calls the
+    model eagerly.
+    """
+    if model.training:
+        return model(state)
+    
+    if model.channels_last:
+        state = state.contiguous(memory_format=torch.channels_last)
+    
+    if model.half_inference:
+        # FP16 forward; outputs come back as FP32 for masking/softmax
+        policy, value = _dispatch_inference(model, state.half())
+        return policy.float(), value.float()
+    return _dispatch_inference(model, state)
+
+
+def _dispatch_inference(model, state):
+    """Pick the CUDA graph, frozen TorchScript or eager forward for `state`."""
+    device = next(model.parameters()).device if model.use_cuda_graphs else None
+    if device is None or device.type != 'cuda':
+        scripted = model.__dict__.get('_scripted')
+        if scripted is not None:
+            return scripted(state)
+        return model(state)
+    
+    # CPU states are accepted here: the runner stages them via pinned memory
+    key = (tuple(state.shape), state.dtype, device)
+    runner = model._cuda_graphs.get(key)
+    if runner is None:
+        runner = _CudaGraphForward(model, state.to(device))
+        model._cuda_graphs[key] = runner
+    return runner(state)
+
+
+class _InferenceMixin:
+    """
+    Inference API shared by AdvancedPolicyValueNet and PolicyValueNet.
+    
+    Subclasses call _init_inference_state() in __init__ and implement
+    forward() (returning (policy logits, value)) and fuse_for_inference(),
+    whose Conv+BatchNorm pairs are the only per-architecture part.
+    """
+    
+    def _init_inference_state(self):
+        # Opt-in CUDA graph replay for get_action_probs/get_value (see
+        # inference_forward); captured graphs are cached per input shape.
+        self.use_cuda_graphs = False
+        self._cuda_graphs = {}
+        # Set by to_half_inference(): run inference forwards in FP16
+        self.half_inference = False
+        # Set by to_channels_last(): feed inference inputs as NHWC
+        self.channels_last = False
+        # Set by slice_policy_head(): the action indices policy_fc still outputs
+        self.register_buffer('policy_action_idx', None, persistent=False)
+    
+    def _reset_compiled(self):
+        """Drop captured CUDA graphs and the frozen TorchScript module (they hold the old layers)."""
+        self._cuda_graphs.clear()
+        self.__dict__.pop('_scripted', None)
+    
+    def forward_probs(self, x):
+        """
+        Forward pass returning (action probabilities, value).
+        
+        For callers that want probabilities; forward() returns logits so
+        training losses and masked inference can skip this softmax.
+        """
+        policy, value = self(x)
+        return F.softmax(policy, dim=1), value
+    
+    def to_half_inference(self):
+        """
+        Convert this model to an FP16 inference model (CUDA only).
+        
+        Fuses Conv+BN first (folding in FP32), then casts the weights to half.
+        inference_forward() casts inputs to FP16 and returns FP32 outputs.
+        """
+        self.fuse_for_inference()
+        self.half()
+        self.half_inference = True
+        self._reset_compiled()
+        return self
+    
+    def to_channels_last(self):
+        """
+        Store conv weights as channels_last (NHWC) for inference.
+        
+        cuDNN and oneDNN have faster NHWC kernels for these 1x1/3x3 convs
+        (and Tensor Cores need NHWC in FP16). inference_forward() converts
+        inputs to match; flattening before the FC layers is layout-agnostic.
+        """
+        self.to(memory_format=torch.channels_last)
+        self.channels_last = True
+        self._reset_compiled()
+        return self
+    
+    def slice_policy_head(self, action_indices):
+        """
+        Shrink policy_fc to the given action indices for inference.
+        
+        policy_fc is Linear(3200, 2500), but only (from, to) pairs that
+        actually occur in play ever score a legal move. Keeping just those
+        rows makes the largest GEMM proportionally smaller; forward() still
+        returns (N, 2500) logits, with _DROPPED_ACTION_LOGIT for the rest.
+        Like fuse_for_inference(), only apply it to an inference copy.
+        
+        Args:
+            action_indices: Action indices to keep (e.g. ReplayBuffer.get_action_indices())
+        """
+        return _slice_policy_head(self, action_indices)
+    
+    def quantize_for_inference(self):
+        """
+        Return an INT8 dynamically-quantized copy of this model (CPU only).
+        
+        The Linear layers (policy_fc dominates the weight bytes) get int8
+        weights with activations quantized on the fly; convs stay FP32.
+        Call after fuse_for_inference(); the original model is unchanged.
+        """
+        self.eval()
+        self.__dict__.pop('_scripted', None)  # ScriptModules don't deepcopy
+        return torch.quantization.quantize_dynamic(self, {nn.Linear}, dtype=torch.qint8)
+    
+    def ipex_optimize(self):
+        """
+        Apply Intel Extension for PyTorch inference optimizations (CPU).
+        
+        Lets oneDNN fuse Conv+BN+ReLU (and Linear+BN) chains into single
+        primitives with weights prepacked for the host's ISA. Returns the
+        model unchanged, with a warning, if IPEX is not installed.
+        """
+        return _ipex_optimize(self)
+    
+    def compile_for_inference(self, example=None):
+        """
+        Trace, freeze and optimize this model with TorchScript for inference.
+        
+        Call after fuse_for_inference() on a model whose weights won't change:
+        freezing bakes the current weights in as constants. get_action_probs,
+        get_value and inference_forward() then dispatch to the frozen module.
+        
+        Args:
+            example: Example input for tracing (default: one zero board)
+        """
+        return _compile_for_inference(self, example)
+    
+    def get_action_probs(self, state, legal_moves=None, temperature=1.0):
+        """
+        Get action probabilities for a given state.
+        
+        Args:
+            state: Board state tensor
+            legal_moves: Legal move indices or a boolean legal mask (optional)
+            temperature: Sampling temperature for exploration
+            
+        Returns:
+            Action probabilities
+        """
+        with torch.inference_mode():
+            policy_logits, _ = inference_forward(self, state)
+            return _action_probs_from_logits(policy_logits, legal_moves, temperature)
+    
+    def batch_action_probs(self, states, legal_masks=None, temperature=1.0):
+        """
+        Action probabilities for a batch of positions in one forward pass.
+        
+        Args:
+            states: Board state tensor (N, 5, 10, 10)
+            legal_masks: Boolean legal-move masks (N, num_actions) (optional)
+            temperature: Sampling temperature for exploration
+            
+        Returns:
+            Action probabilities (N, num_actions)
+        """
+        return _batch_action_probs(self, states, legal_masks, temperature)
+    
+    def predict(self, state, legal_moves=None, temperature=1.0):
+        """
+        Action probabilities and value from a single forward pass.
+        
+        Use this instead of get_action_probs + get_value when both are needed
+        for the same state; each of those runs the full conv tower.
+        
+        Returns:
+            (action probabilities, value)
+        """
+        return _predict(self, state, legal_moves, temperature)
+    
+    def get_value(self, state):
+        """Get state value estimation (see predict() if the policy is needed too)."""
+        with torch.inference_mode():
+            _, value = inference_forward(self, state)
+            return value.clone()
+
 
 class SpatialAttention(nn.Module):
     """
@@ -27,15 +418,19 @@ class ResidualBlock(nn.Module):
         self.bn2 = nn.BatchNorm2d(channels)
         
     def forward(self, x):
-        residual = x
-        out = F.relu(self.bn1(self.conv1(x)))
+        out = F.relu_(self.bn1(self.conv1(x)))
         out = self.bn2(self.conv2(out))
-        out += residual
-        out = F.relu(out)
-        return out
+        # In place on bn2's output (BN backward only needs its input); x is
+        # left untouched since the caller may still hold it
+        return F.relu_(out.add_(x))
+    
+    def fuse_for_inference(self):
+        """Fold both BatchNorms into their convs (eval mode only)."""
+        _fuse_conv_bn_pairs(self, [('conv1', 'bn1'), ('conv2', 'bn2')])
+        return self
 
 
-class AdvancedPolicyValueNet(nn.Module):
+class AdvancedPolicyValueNet(_InferenceMixin, nn.Module):
     """
     ENHANCED Architecture for 10x10 Checkers AI.
     
@@ -48,7 +443,7 @@ class AdvancedPolicyValueNet(nn.Module):
     Architecture:
     - Input: (batch, 5, 10, 10) - 5 channels for piece representation
     - Deep residual tower with attention
-    - Policy head: outputs action probabilities (2500 actions)
+    - Policy head: outputs action logits (2500 actions)
     - Value head: outputs state value estimation
     - Material head: predicts material balance (auxiliary)
     - Threat head: predicts threat map (auxiliary)
@@ -60,6 +455,8 @@ class AdvancedPolicyValueNet(nn.Module):
         self.board_size = board_size
         self.num_actions = num_actions
         
+        self._init_inference_state()
+        
         # Input projection (5 -> 128 channels)
         self.input_conv = nn.Conv2d(5, 128, kernel_size=3, padding=1)
         self.input_bn = nn.BatchNorm2d(128)
@@ -93,17 +490,19 @@ class AdvancedPolicyValueNet(nn.Module):
         # Outputs: (batch, 1, 10, 10) threat map
         self.threat_head = nn.Conv2d(128, 1, kernel_size=1)
         
-    def forward(self, x, return_aux=False):
+    def forward(self, x, return_aux=False, compute_threat=True):
         """
         Forward pass through the network.
         
         Args:
             x: Input tensor of shape (batch, 5, 10, 10)
             return_aux: If True, also return auxiliary predictions
+            compute_threat: If False, skip the threat head (threat_map is None)
             
         Returns:
             If return_aux=False:
-                policy: Action probabilities (batch, num_actions)
+                policy: Action logits (batch, num_actions); apply softmax
+                    (or log_softmax) to get probabilities
                 value: State value estimation (batch, 1)
             If return_aux=True:
                 policy, value, material_pred, threat_map
@@ -119,13 +518,14 @@ class AdvancedPolicyValueNet(nn.Module):
         
         # Policy head
         policy = F.relu(self.policy_bn(self.policy_conv(x)))
-        policy = policy.view(policy.size(0), -1)
+        policy = torch.flatten(policy, 1)  # copies only for channels_last
         policy = self.policy_fc(policy)
-        policy = F.softmax(policy, dim=1)
+        if self.policy_action_idx is not None:
+            policy = _scatter_policy(policy, self.policy_action_idx, self.num_actions)
         
         # Value head
         value = F.relu(self.value_bn(self.value_conv(x)))
-        value_flat = value.view(value.size(0), -1)
+        value_flat = torch.flatten(value, 1)
         value_features = F.relu(self.value_fc1(value_flat))
         value = torch.tanh(self.value_fc2(value_features))
         
@@ -134,50 +534,30 @@ class AdvancedPolicyValueNet(nn.Module):
         
         # Auxiliary predictions (used during training)
         material_pred = F.softmax(self.material_head(value_features), dim=1)
-        threat_map = torch.sigmoid(self.threat_head(x))
+        threat_map = torch.sigmoid(self.threat_head(x)) if compute_threat else None
         
         return policy, value, material_pred, threat_map
     
-    def get_action_probs(self, state, legal_moves=None, temperature=1.0):
+    def fuse_for_inference(self):
         """
-        Get action probabilities for a given state.
+        Fold every Conv+BatchNorm pair into a single Conv for inference.
         
-        Args:
-            state: Board state tensor
-            legal_moves: List of legal move indices (optional)
-            temperature: Sampling temperature for exploration
-            
-        Returns:
-            Action probabilities
+        Switches the model to eval mode. The fused model has no BN entries in
+        its state_dict, so fuse a separate inference copy after loading
+        weights; never fuse a model that is still being trained or synced.
         """
-        with torch.no_grad():
-            policy, _ = self.forward(state)
-            
-            if legal_moves is not None:
-                # Mask illegal moves
-                mask = torch.zeros_like(policy)
-                mask[:, legal_moves] = 1.0
-                policy = policy * mask
-                
-                # Renormalize
-                policy = policy / (policy.sum(dim=1, keepdim=True) + 1e-8)
-            
-            # Apply temperature
-            if temperature != 1.0:
-                policy = torch.pow(policy, 1.0 / temperature)
-                policy = policy / (policy.sum(dim=1, keepdim=True) + 1e-8)
-            
-            return policy
-    
-    def get_value(self, state):
-        """Get state value estimation."""
-        with torch.no_grad():
-            _, value = self.forward(state)
-            return value
+        self.eval()
+        self._reset_compiled()
+        _fuse_conv_bn_pairs(self, [('input_conv', 'input_bn'),
+                                   ('policy_conv', 'policy_bn'),
+                                   ('value_conv', 'value_bn')])
+        for block in self.res_tower:
+            block.fuse_for_inference()
+        return self
 
 
 # Keep old network for backwards compatibility
-class PolicyValueNet(nn.Module):
+class PolicyValueNet(_InferenceMixin, nn.Module):
     """
     Original Policy-Value Network (kept for compatibility).
     Use AdvancedPolicyValueNet for new training.
@@ -189,6 +569,8 @@ class PolicyValueNet(nn.Module):
         self.board_size = board_size
         self.num_actions = num_actions
         
+        self._init_inference_state()
+        
         # Shared convolutional layers
         self.conv1 = nn.Conv2d(5, 64, kernel_size=3, padding=1)
         self.bn1 = nn.BatchNorm2d(64)
@@ -215,7 +597,7 @@ class PolicyValueNet(nn.Module):
         self.value_fc2 = nn.Linear(256, 1)
         
     def forward(self, x):
-        """Forward pass through the network."""
+        """Forward pass through the network. Returns (policy logits, value)."""
         # Shared layers
         x = F.relu(self.bn1(self.conv1(x)))
         x = F.relu(self.bn2(self.conv2(x)))
@@ -227,41 +609,33 @@ class PolicyValueNet(nn.Module):
         
         # Policy head
         policy = F.relu(self.policy_bn(self.policy_conv(x)))
-        policy = policy.view(policy.size(0), -1)
+        policy = torch.flatten(policy, 1)  # copies only for channels_last
         policy = self.policy_fc(policy)
-        policy = F.softmax(policy, dim=1)
+        if self.policy_action_idx is not None:
+            policy = _scatter_policy(policy, self.policy_action_idx, self.num_actions)
         
         # Value head
         value = F.relu(self.value_bn(self.value_conv(x)))
-        value = value.view(value.size(0), -1)
+        value = torch.flatten(value, 1)
         value = F.relu(self.value_fc1(value))
         value = torch.tanh(self.value_fc2(value))
         
         return policy, value
     
-    def get_action_probs(self, state, legal_moves=None, temperature=1.0):
-        """Get action probabilities for a given state."""
-        with torch.no_grad():
-            policy, _ = self.forward(state)
-            
-            if legal_moves is not None:
-                # Mask illegal moves
-                mask = torch.zeros_like(policy)
-                mask[:, legal_moves] = 1.0
-                policy = policy * mask
-                
-                # Renormalize
-                policy = policy / (policy.sum(dim=1, keepdim=True) + 1e-8)
-            
-            # Apply temperature
-            if temperature != 1.0:
-                policy = torch.pow(policy, 1.0 / temperature)
-                policy = policy / (policy.sum(dim=1, keepdim=True) + 1e-8)
-            
-            return policy
-    
-    def get_value(self, state):
-        """Get state value estimation."""
-        with torch.no_grad():
-            _, value = self.forward(state)
-            return value
+    def fuse_for_inference(self):
+        """
+        Fold every Conv+BatchNorm pair into a single Conv for inference.
+        
+        Switches the model to eval mode. The fused model has no BN entries in
+        its state_dict, so fuse a separate inference copy after loading
+        weights; never fuse a model that is still being trained or synced.
+        """
+        self.eval()
+        self._reset_compiled()
+        _fuse_conv_bn_pairs(self, [('conv1', 'bn1'), ('conv2', 'bn2'), ('conv3', 'bn3'),
+                                   ('policy_conv', 'policy_bn'),
+                                   ('value_conv', 'value_bn')])
+        self.res1.fuse_for_inference()
+        self.res2.fuse_for_inference()
+        return self
+    
\ No newline at end of file
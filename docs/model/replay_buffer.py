@@ -1,8 +1,265 @@
 import sqlite3
+import asyncio
+import contextlib
 import json
+import struct
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import threading
+import aiosqlite
+import numpy as np
+import torch
+from model.encoder import board_to_codes, encode_codes, encode_move, encode_moves
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# JSON for what is still stored as text (legacy rows and boards/moves that
+# don't pack); orjson is several times faster
+if orjson is not None:
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Packed action: from_row, from_col, to_row, to_col as unsigned bytes
+_ACTION = struct.Struct('<4B')
+
+# PRAGMA user_version of the current trajectory storage format:
+# 1 = boards, actions and heuristic moves packed as BLOBs (see _migrate_packed_rows)
+# 2 = trajectories.timestamp copied from the game row
+# 3 = trigger-maintained counters in the stats table
+_SCHEMA_VERSION = 3
+
+# Counters kept by the stats triggers; win counts are stored as 'wins:<winner>'
+_STATS_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_games_ins AFTER INSERT ON games BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'total_games';
+        UPDATE stats SET value = value + IFNULL(NEW.total_moves, 0) WHERE key = 'total_moves';
+        INSERT INTO stats (key, value) VALUES ('wins:' || IFNULL(NEW.winner, ''), 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1;
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_games_del AFTER DELETE ON games BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'total_games';
+        UPDATE stats SET value = value - IFNULL(OLD.total_moves, 0) WHERE key = 'total_moves';
+        UPDATE stats SET value = value - 1 WHERE key = 'wins:' || IFNULL(OLD.winner, '');
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_games_upd AFTER UPDATE OF winner, total_moves ON games BEGIN
+        UPDATE stats SET value = value + IFNULL(NEW.total_moves, 0) - IFNULL(OLD.total_moves, 0)
+            WHERE key = 'total_moves';
+        UPDATE stats SET value = value - 1 WHERE key = 'wins:' || IFNULL(OLD.winner, '');
+        INSERT INTO stats (key, value) VALUES ('wins:' || IFNULL(NEW.winner, ''), 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1;
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_traj_ins AFTER INSERT ON trajectories BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'total_trajectories';
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_traj_del AFTER DELETE ON trajectories BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'total_trajectories';
+    END;
+    ''',
+)
+
+
+def _stats_from_rows(rows) -> Dict:
+    """Build the get_stats() dict from (key, value) rows of the stats table."""
+    counters = dict(rows)
+    total_games = int(counters.get('total_games', 0))
+    wins = {key[5:] or None: int(value) for key, value in counters.items()
+            if key.startswith('wins:') and value > 0}
+    return {
+        'total_games': total_games,
+        'total_trajectories': int(counters.get('total_trajectories', 0)),
+        'wins': wins,
+        'average_moves': counters.get('total_moves', 0) / total_games if total_games else 0
+    }
+
+
+def _pack_board(board) -> Tuple[object, Optional[bytes]]:
+    """
+    Pack a board for storage as (board column value, state_enc blob).
+    
+    The board is stored as its 100 int8 piece codes (see board_to_codes) and
+    the encoded (5, 10, 10) network planes as uint8 bytes. Boards that can't
+    be coded fall back to JSON text with no encoded planes.
+    """
+    try:
+        codes = board_to_codes(board)
+    except Exception:
+        return _json_dumps(board), None
+    return codes.tobytes(), encode_codes(codes).astype(np.uint8).tobytes()
+
+
+def _unpack_board(value):
+    """Inverse of _pack_board: a (10, 10) int8 code array, or the JSON board of legacy rows."""
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype=np.int8).reshape(10, 10)
+    return _json_loads(value)
+
+
+def _pack_action(action):
+    """Pack a {'from': [r, c], 'to': [r, c]} move into 4 bytes (JSON text if it doesn't fit)."""
+    try:
+        return _ACTION.pack(*action['from'], *action['to'])
+    except (KeyError, TypeError, struct.error):
+        return _json_dumps(action)
+
+
+def _unpack_action(value) -> Dict:
+    """Inverse of _pack_action; legacy rows hold JSON text."""
+    if isinstance(value, bytes):
+        from_row, from_col, to_row, to_col = _ACTION.unpack(value)
+        return {'from': (from_row, from_col), 'to': (to_row, to_col)}
+    return _json_loads(value)
+
+
+def decode_blob(blob: bytes) -> np.ndarray:
+    """Inverse of _pack_board's state_enc: a read-only (5, 10, 10) uint8 view of the planes."""
+    return np.frombuffer(blob, dtype=np.uint8).reshape(5, 10, 10)
+
+
+# Fields get_random_trajectories can project: name -> (column, decoder or None)
+_TRAJECTORY_FIELDS = {
+    'board_state': ('board_state', _unpack_board),
+    'action': ('action', _unpack_action),
+    'reward': ('reward', None),
+    'next_state': ('next_state', _unpack_board),
+    'done': ('done', bool),
+    'id': ('id', None),
+    'state_enc': ('state_enc', None),
+    'next_state_enc': ('next_state_enc', None),
+}
+_ALL_TRAJECTORY_FIELDS = tuple(_TRAJECTORY_FIELDS)
+
+# Id lists are bound as one JSON array parameter (see _id_list) rather than
+# an IN (?, ?, ...) per id, so each statement's text is fixed and stays in
+# the connection's statement cache instead of being re-parsed per length
+_SQL_IDS_IN = "id IN (SELECT value FROM json_each(?))"
+
+# Unary + keeps the planner off the player-leading indexes (which would scan
+# every row of the player): the ids are probed on the primary key instead
+_SQL_PLAYER_IDS = f"SELECT id FROM trajectories WHERE +player = ? AND {_SQL_IDS_IN}"
+
+# Rows added since the cached priorities' last id; +player keeps this a
+# rowid range scan (new rows only) instead of a walk of the player's index
+_SQL_NEW_PRIORITIES = """
+    SELECT id, IFNULL(priority, 0.0) FROM trajectories
+    WHERE id > ? AND +player = ?
+    ORDER BY id
+"""
+
+_SQL_TRAINING_ROWS = f"""
+    SELECT board_state, action, reward, next_state, done, heuristic_score,
+           state_enc, next_state_enc
+    FROM trajectories
+    WHERE {_SQL_IDS_IN}
+"""
+
+_SQL_PRIORITIZED_ROWS = f"""
+    SELECT board_state, action, reward, next_state, done, priority,
+           heuristic_score, heuristic_move, id,
+           state_enc, next_state_enc
+    FROM trajectories
+    WHERE {_SQL_IDS_IN}
+"""
+
+
+def _id_list(ids) -> str:
+    """Bind value for _SQL_IDS_IN: the ids as a JSON array."""
+    return _json_dumps(list(ids))
+
+
+def _empty_training_batch(batch_size: int, pin_memory: bool = False) -> Dict[str, np.ndarray]:
+    """Uninitialized arrays for get_training_batch (page-locked if pin_memory)."""
+    def empty(shape, dtype):
+        return torch.empty(shape, dtype=dtype, pin_memory=pin_memory).numpy()
+    
+    return {
+        'states': empty((batch_size, 5, 10, 10), torch.float32),
+        'next_states': empty((batch_size, 5, 10, 10), torch.float32),
+        'actions': empty((batch_size,), torch.int64),
+        'rewards': empty((batch_size,), torch.float32),
+        'dones': empty((batch_size,), torch.bool),
+        'heuristic_scores': empty((batch_size,), torch.float32),
+        'boards': empty((batch_size, 10, 10), torch.int8),
+    }
+
+
+def _fill_training_rows(cursor, batch: Dict[str, np.ndarray], filled: int) -> int:
+    """Decode every row of an executed batch query into `batch` from slot `filled` on."""
+    batch_size = len(batch['actions'])
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return filled
+        if _fill_packed_rows(batch, filled, rows):
+            filled += len(rows)
+            continue
+        for row in rows:
+            _fill_training_row(batch, filled, row)
+            filled += 1
+
+
+def _fill_packed_rows(batch: Dict[str, np.ndarray], filled: int, rows) -> bool:
+    """
+    Bulk path of _fill_training_rows: when every row is fully packed, join each
+    BLOB column and decode it with one np.frombuffer instead of per row.
+    Returns False (filling nothing) if any row needs the legacy decoder.
+    """
+    for row in rows:
+        if not (isinstance(row[0], bytes) and isinstance(row[1], bytes)
+                and row[6] is not None and row[7] is not None):
+            return False
+    
+    n = len(rows)
+    end = filled + n
+    columns = list(zip(*rows))
+    batch['boards'][filled:end] = np.frombuffer(b''.join(columns[0]), dtype=np.int8).reshape(n, 10, 10)
+    batch['states'][filled:end] = np.frombuffer(b''.join(columns[6]), dtype=np.uint8).reshape(n, 5, 10, 10)
+    batch['next_states'][filled:end] = np.frombuffer(b''.join(columns[7]), dtype=np.uint8).reshape(n, 5, 10, 10)
+    batch['actions'][filled:end] = encode_moves(
+        np.frombuffer(b''.join(columns[1]), dtype=np.uint8).reshape(n, 4))
+    batch['rewards'][filled:end] = columns[2]
+    batch['dones'][filled:end] = columns[4]
+    batch['heuristic_scores'][filled:end] = [score or 0.0 for score in columns[5]]
+    return True
+
+
+def _fill_training_row(batch: Dict[str, np.ndarray], i: int, row):
+    """
+    Decode one (board_state, action, reward, next_state, done, heuristic_score,
+    state_enc, next_state_enc) row into slot `i` of get_training_batch's arrays.
+    """
+    codes = board_to_codes(_unpack_board(row[0]))
+    batch['boards'][i] = codes
+    if row[6] is not None and row[7] is not None:
+        batch['states'][i] = decode_blob(row[6])
+        batch['next_states'][i] = decode_blob(row[7])
+    else:
+        # Legacy row without pre-encoded planes
+        encode_codes(codes, out=batch['states'][i])
+        encode_codes(board_to_codes(_unpack_board(row[3])), out=batch['next_states'][i])
+    
+    action = _unpack_action(row[1])
+    batch['actions'][i] = encode_move(action['from'][0], action['from'][1],
+                                      action['to'][0], action['to'][1])
+    batch['rewards'][i] = row[2]
+    batch['dones'][i] = bool(row[4])
+    batch['heuristic_scores'][i] = row[5] or 0.0
+
 
 class ReplayBuffer:
     """
@@ -10,6 +267,13 @@ class ReplayBuffer:
     Supports online learning by accumulating game data for training.
     """
     
+    # add_game checks the max_games limit once per this many games, so the
+    # buffer may briefly hold up to this many extra games
+    CLEANUP_INTERVAL = 50
+    
+    # Most aiosqlite read connections the async API methods open
+    ASYNC_POOL_SIZE = 8
+    
     def __init__(self, db_path: str = None, max_games: int = 10000):
         # Use config path if not specified
         if db_path is None:
@@ -18,12 +282,104 @@ class ReplayBuffer:
         else:
             self.db_path = db_path
         self.max_games = max_games
-        self.lock = threading.Lock()
+        self._games_since_cleanup = 0
+        # Long-lived connections: one writer shared by all threads (serialized
+        # by _write_lock) and one query_only reader per thread (see _read_conn).
+        # WAL lets the readers run alongside the writer without any lock.
+        self._write_lock = threading.Lock()
+        self._write_conn = self._connect()
+        self._local = threading.local()
+        self._read_conns = []
+        self._read_conns_lock = threading.Lock()
+        # aiosqlite readers for the *_async methods, created in the event loop
+        self._async_pool = None
+        self._async_opened = 0
+        # PCG64 generator for priority sampling
+        self._rng = np.random.default_rng()
+        # player -> (ids, priorities) in id order, synced by _priority_arrays
+        self._priority_cache = {}
+        self._priority_lock = threading.Lock()
         self._init_db()
     
+    @property
+    def _read_conn(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with WAL journaling and the tuned PRAGMAs."""
+        # check_same_thread=False: the writer is shared, and close() closes
+        # every thread's reader
+        # The readers issue a few dozen distinct statements; keep all prepared
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA busy_timeout=5000")  # wait up to 5 s for another process's writer
+        conn.execute("PRAGMA journal_mode=WAL")  # persists in the database file
+        conn.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints, not every commit
+        conn.execute("PRAGMA wal_autocheckpoint=1000")  # checkpoint every ~1000 WAL pages
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+        # INSERT OR REPLACE only fires the stats delete triggers with this on
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+    
+    def close(self):
+        """Close the writer and every thread's reader connection."""
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+        self._local = threading.local()
+        with self._write_lock:
+            self._write_conn.close()
+    
+    async def _open_async_reader(self) -> aiosqlite.Connection:
+        """Open an aiosqlite read-only connection with the reader PRAGMAs."""
+        conn = await aiosqlite.connect(self.db_path)
+        for pragma in ("busy_timeout=5000", "temp_store=MEMORY", "mmap_size=268435456",
+                       "cache_size=-65536", "query_only=1"):
+            await conn.execute(f"PRAGMA {pragma}")
+        return conn
+    
+    @contextlib.asynccontextmanager
+    async def _async_reader(self):
+        """Borrow a pooled aiosqlite reader, opening up to ASYNC_POOL_SIZE on demand."""
+        if self._async_pool is None:
+            self._async_pool = asyncio.LifoQueue()
+        try:
+            conn = self._async_pool.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._async_opened < self.ASYNC_POOL_SIZE:
+                self._async_opened += 1
+                try:
+                    conn = await self._open_async_reader()
+                except Exception:
+                    self._async_opened -= 1
+                    raise
+            else:
+                conn = await self._async_pool.get()
+        try:
+            yield conn
+        finally:
+            self._async_pool.put_nowait(conn)
+    
+    async def aclose(self):
+        """Close the pooled aiosqlite readers (call from the event loop)."""
+        while self._async_pool is not None and not self._async_pool.empty():
+            conn = self._async_pool.get_nowait()
+            await conn.close()
+            self._async_opened -= 1
+    
     def _init_db(self):
         """Initialize the database schema."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write_lock, self._write_conn as conn:
             cursor = conn.cursor()
             
             # Games table
@@ -44,19 +400,69 @@ class ReplayBuffer:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     game_id TEXT,
                     move_number INTEGER,
-                    board_state TEXT,
-                    action TEXT,
+                    board_state BLOB,
+                    action BLOB,
                     reward REAL,
-                    next_state TEXT,
+                    next_state BLOB,
                     done INTEGER,
                     player TEXT,
                     priority REAL DEFAULT 1.0,
                     heuristic_score REAL DEFAULT 0.0,
-                    heuristic_move TEXT,
+                    heuristic_move BLOB,
+                    timestamp TEXT,
                     FOREIGN KEY (game_id) REFERENCES games(game_id)
                 )
             """)
             
+            # Boards, actions and heuristic moves are packed BLOBs
+            # (_pack_board/_pack_action). Databases created before that declare
+            # the columns TEXT, which stores BLOBs unchanged; their JSON rows are
+            # repacked once below. Readers accept either format.
+            
+            # Migration: pre-encoded state planes (added after the first release)
+            # and the game timestamp denormalized for index-ordered recent reads
+            cursor.execute("PRAGMA table_info(trajectories)")
+            columns = {row[1] for row in cursor.fetchall()}
+            for column, column_type in (("state_enc", "BLOB"), ("next_state_enc", "BLOB"),
+                                        ("timestamp", "TEXT")):
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE trajectories ADD COLUMN {column} {column_type}")
+            
+            cursor.execute("PRAGMA user_version")
+            version = cursor.fetchone()[0]
+            if version < 1:
+                self._migrate_packed_rows(conn)
+            if version < 2:
+                cursor.execute("""
+                    UPDATE trajectories
+                    SET timestamp = (SELECT g.timestamp FROM games g WHERE g.game_id = trajectories.game_id)
+                    WHERE timestamp IS NULL
+                """)
+            
+            # Row counts for get_stats(), kept current by triggers instead of
+            # COUNT(*)/AVG scans over both tables on every call
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stats (
+                    key TEXT PRIMARY KEY,
+                    value REAL
+                )
+            """)
+            if version < 3:
+                # Seed the counters from the existing rows; the triggers are
+                # created in the same transaction, so no write slips between
+                cursor.execute("DELETE FROM stats")
+                cursor.execute("""
+                    INSERT INTO stats (key, value)
+                    SELECT 'total_games', COUNT(*) FROM games
+                    UNION ALL SELECT 'total_moves', IFNULL(SUM(total_moves), 0) FROM games
+                    UNION ALL SELECT 'total_trajectories', COUNT(*) FROM trajectories
+                    UNION ALL SELECT 'wins:' || IFNULL(winner, ''), COUNT(*) FROM games GROUP BY winner
+                """)
+            for trigger in _STATS_TRIGGERS:
+                cursor.execute(trigger)
+            if version < _SCHEMA_VERSION:
+                cursor.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            
             # Create indices for faster queries
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_game_id 
@@ -68,30 +474,80 @@ class ReplayBuffer:
                 ON games(timestamp)
             """)
             
-            # NEW: Index  for priority-based sampling
+            # Recent-trajectory reads walk this index in order (no JOIN, no sort)
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_priority
-                ON trajectories(priority DESC)
+                CREATE INDEX IF NOT EXISTS idx_traj_player_ts
+                ON trajectories(player, timestamp DESC, move_number)
             """)
             
+            # Superseded by the index above; priority sampling reads new rows
+            # by rowid into a cache instead (see _priority_arrays)
+            cursor.execute("DROP INDEX IF EXISTS idx_player_game")
+            cursor.execute("DROP INDEX IF EXISTS idx_priority")
+            cursor.execute("DROP INDEX IF EXISTS idx_traj_player_prio")
+            
             conn.commit()
+            
+            # Refresh planner statistics where they are stale (cheap, unlike ANALYZE)
+            cursor.execute("PRAGMA optimize")
+    
+    def _migrate_packed_rows(self, conn, chunk_size: int = 1000):
+        """One-time repack of legacy JSON trajectory rows into the BLOB format."""
+        cursor = conn.cursor()
+        last_id = 0
+        migrated = 0
+        while True:
+            cursor.execute("""
+                SELECT id, board_state, action, next_state, heuristic_move
+                FROM trajectories
+                WHERE id > ? AND (typeof(board_state) = 'text' OR typeof(action) = 'text'
+                                  OR typeof(next_state) = 'text' OR typeof(heuristic_move) = 'text')
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            updates = []
+            for traj_id, board, action, next_board, heuristic_move in rows:
+                try:
+                    board_blob, state_enc = _pack_board(_unpack_board(board))
+                    next_blob, next_state_enc = _pack_board(_unpack_board(next_board))
+                    updates.append((board_blob, _pack_action(_unpack_action(action)), next_blob,
+                                    _pack_action(_unpack_action(heuristic_move)) if heuristic_move else None,
+                                    state_enc, next_state_enc, traj_id))
+                except Exception:
+                    continue  # leave unreadable rows as they are
+            cursor.executemany("""
+                UPDATE trajectories
+                SET board_state = ?, action = ?, next_state = ?, heuristic_move = ?,
+                    state_enc = COALESCE(state_enc, ?), next_state_enc = COALESCE(next_state_enc, ?)
+                WHERE id = ?
+            """, updates)
+            migrated += len(updates)
+        
+        if migrated:
+            print(f"Replay buffer: repacked {migrated} legacy trajectory rows")
     
     def add_game(self, game_id: str, winner: str, total_moves: int, 
                  duration_seconds: float, player_color: str = "black"):
         """Add a completed game to the database."""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO games 
-                    (game_id, winner, total_moves, duration_seconds, timestamp, player_color)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (game_id, winner, total_moves, duration_seconds, 
-                      datetime.now().isoformat(), player_color))
-                conn.commit()
-                
-                # Clean up old games if over limit
+        with self._write_lock, self._write_conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO games 
+                (game_id, winner, total_moves, duration_seconds, timestamp, player_color)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (game_id, winner, total_moves, duration_seconds, 
+                  datetime.now().isoformat(), player_color))
+            conn.commit()
+            
+            # Clean up old games if over limit (first game, then every CLEANUP_INTERVAL)
+            if self._games_since_cleanup % self.CLEANUP_INTERVAL == 0:
                 self._cleanup_old_games(conn)
+            self._games_since_cleanup += 1
     
     def add_trajectory(self, game_id: str, move_number: int, board_state: Dict,
                       action: Dict, reward: float, next_state: Dict,
@@ -105,64 +561,90 @@ class ReplayBuffer:
             heuristic_score: Value prediction from heuristic AI
             heuristic_move: Best move suggested by heuristic AI
         """
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO trajectories 
-                    (game_id, move_number, board_state, action, reward, next_state, 
-                     done, player, priority, heuristic_score, heuristic_move)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (game_id, move_number, json.dumps(board_state), 
-                      json.dumps(action), reward, json.dumps(next_state), 
-                      int(done), player, priority, heuristic_score, 
-                      json.dumps(heuristic_move) if heuristic_move else None))
-                conn.commit()
+        board_blob, state_enc = _pack_board(board_state)
+        next_blob, next_state_enc = _pack_board(next_state)
+        with self._write_lock, self._write_conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO trajectories 
+                (game_id, move_number, board_state, action, reward, next_state, 
+                 done, player, priority, heuristic_score, heuristic_move,
+                 state_enc, next_state_enc, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                        (SELECT timestamp FROM games WHERE game_id = ?))
+            """, (game_id, move_number, board_blob,
+                  _pack_action(action), reward, next_blob,
+                  int(done), player, priority, heuristic_score, 
+                  _pack_action(heuristic_move) if heuristic_move else None,
+                  state_enc, next_state_enc, game_id))
+            conn.commit()
     
     def add_batch_trajectories(self, game_id: str, trajectories: List[Dict]):
-        """Add multiple trajectories at once (more efficient)."""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                batch_data = [
-                    (game_id, t['move_number'], json.dumps(t['board_state']),
-                     json.dumps(t['action']), t['reward'], json.dumps(t['next_state']),
-                     int(t['done']), t['player'])
-                    for t in trajectories
-                ]
-                cursor.executemany("""
-                    INSERT INTO trajectories 
-                    (game_id, move_number, board_state, action, reward, next_state, done, player)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, batch_data)
-                conn.commit()
+        """
+        Add multiple trajectories at once (more efficient).
+        
+        All rows go in with one executemany in a single transaction. Each dict
+        takes the add_trajectory fields; 'priority', 'heuristic_score' and
+        'heuristic_move' are optional.
+        """
+        batch_data = []
+        for t in trajectories:
+            board_blob, state_enc = _pack_board(t['board_state'])
+            next_blob, next_state_enc = _pack_board(t['next_state'])
+            heuristic_move = t.get('heuristic_move')
+            batch_data.append((game_id, t['move_number'], board_blob,
+                               _pack_action(t['action']), t['reward'], next_blob,
+                               int(t['done']), t['player'],
+                               t.get('priority', 1.0), t.get('heuristic_score', 0.0),
+                               _pack_action(heuristic_move) if heuristic_move else None,
+                               state_enc, next_state_enc, game_id))
+        
+        with self._write_lock, self._write_conn as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO trajectories 
+                (game_id, move_number, board_state, action, reward, next_state, done, player,
+                 priority, heuristic_score, heuristic_move, state_enc, next_state_enc, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                        (SELECT timestamp FROM games WHERE game_id = ?))
+            """, batch_data)
+            conn.commit()
     
     def get_recent_trajectories(self, limit: int = 1000, player: str = "black") -> List[Dict]:
-        """Get recent trajectories for training."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Get recent trajectories for training.
+        
+        Rows carry their game's timestamp, so this reads idx_traj_player_ts
+        in order and stops after `limit` rows (no JOIN, no sort).
+        """
+        with self._read_conn as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT t.board_state, t.action, t.reward, t.next_state, t.done
-                FROM trajectories t
-                JOIN games g ON t.game_id = g.game_id
-                WHERE t.player = ?
-                ORDER BY g.timestamp DESC, t.move_number
+                SELECT board_state, action, reward, next_state, done, id,
+                       state_enc, next_state_enc
+                FROM trajectories
+                WHERE player = ?
+                ORDER BY timestamp DESC, move_number
                 LIMIT ?
             """, (player, limit))
             
             results = []
             for row in cursor.fetchall():
                 results.append({
-                    'board_state': json.loads(row[0]),
-                    'action': json.loads(row[1]),
+                    'board_state': _unpack_board(row[0]),
+                    'action': _unpack_action(row[1]),
                     'reward': row[2],
-                    'next_state': json.loads(row[3]),
-                    'done': bool(row[4])
+                    'next_state': _unpack_board(row[3]),
+                    'done': bool(row[4]),
+                    'id': row[5],
+                    'state_enc': row[6],
+                    'next_state_enc': row[7]
                 })
             
             return results
     
-    def get_random_trajectories(self, limit: int = 200, player: str = "black") -> List[Dict]:
+    def get_random_trajectories(self, limit: int = 200, player: str = "black",
+                                fields: Tuple[str, ...] = _ALL_TRAJECTORY_FIELDS) -> List[Dict]:
         """
         CRITICAL: Get random historical trajectories.
         Used for preventing catastrophic forgetting.
@@ -170,32 +652,78 @@ class ReplayBuffer:
         Args:
             limit: Number of random trajectories to sample
             player: Player color to filter by
+            fields: Keys to return (any of _TRAJECTORY_FIELDS); only these
+                columns are read and decoded
             
         Returns:
             List of random trajectory dictionaries
         """
-        with sqlite3.connect(self.db_path) as conn:
+        unknown = set(fields) - _TRAJECTORY_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Unknown trajectory fields: {sorted(unknown)}")
+        columns = [_TRAJECTORY_FIELDS[name] for name in fields]
+        
+        with self._read_conn as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT t.board_state, t.action, t.reward, t.next_state, t.done
-                FROM trajectories t
-                WHERE t.player = ?
-                ORDER BY RANDOM()
-                LIMIT ?
-            """, (player, limit))
+            ids = self._sample_random_ids(cursor, player, limit)
+            cursor.execute(f"SELECT {', '.join(column for column, _ in columns)} "
+                           f"FROM trajectories WHERE {_SQL_IDS_IN}", (_id_list(ids),))
             
             results = []
             for row in cursor.fetchall():
                 results.append({
-                    'board_state': json.loads(row[0]),
-                    'action': json.loads(row[1]),
-                    'reward': row[2],
-                    'next_state': json.loads(row[3]),
-                    'done': bool(row[4])
+                    name: decode(value) if decode is not None and value is not None else value
+                    for name, (_, decode), value in zip(fields, columns, row)
                 })
             
             return results
     
+    def _sample_random_ids(self, cursor, player: str, limit: int,
+                           oversample: int = 3, rounds: int = 4) -> List[int]:
+        """
+        Draw up to `limit` distinct uniformly random trajectory ids for `player`.
+        
+        Avoids ORDER BY RANDOM(), which sorts the whole table: random ids are
+        drawn from [MIN(id), MAX(id)] (both O(log N) on the primary key) and
+        kept if the row exists and belongs to `player`, which is rejection
+        sampling and so still uniform over the matching rows. Ids freed by
+        cleanup and the other player's rows are covered by oversampling;
+        if a few rounds don't fill the sample (tiny or very sparse table),
+        fall back to ORDER BY RANDOM() over the ids alone.
+        
+        Accepted ids are taken in the order they were drawn: the query
+        returns them in id order, and truncating that would favor old rows.
+        """
+        if limit <= 0:
+            return []
+        cursor.execute("SELECT MIN(id), MAX(id) FROM trajectories")
+        low, high = cursor.fetchone()
+        if high is None:
+            return []
+        
+        ids = {}  # accepted ids, in draw order
+        for _ in range(rounds):
+            draw = (limit - len(ids)) * oversample
+            candidates = [i for i in dict.fromkeys(
+                self._rng.integers(low, high + 1, size=draw).tolist()) if i not in ids]
+            cursor.execute(_SQL_PLAYER_IDS, (player, _id_list(candidates)))
+            matched = {row[0] for row in cursor.fetchall()}
+            for traj_id in candidates:
+                if len(ids) >= limit:
+                    break
+                if traj_id in matched:
+                    ids[traj_id] = None
+            if len(ids) >= limit:
+                return list(ids)
+        
+        cursor.execute("""
+            SELECT id FROM trajectories
+            WHERE player = ?
+            ORDER BY RANDOM()
+            LIMIT ?
+        """, (player, limit))
+        return [row[0] for row in cursor.fetchall()]
+    
     def get_mixed_trajectories(self, batch_size: int = 32, recent_ratio: float = 0.8, player: str = "black") -> List[Dict]:
         """
         CRITICAL: Get mixed batch of recent and historical trajectories.
@@ -225,6 +753,149 @@ class ReplayBuffer:
         
         return mixed
     
+    def get_training_batch(self, batch_size: int = 32, recent_ratio: float = 0.8,
+                           player: str = "black", pin_memory: bool = False) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Sample a mixed recent/historical batch straight into training arrays.
+        
+        Same sampling as get_mixed_trajectories, but rows are decoded directly
+        into preallocated arrays instead of per-row dicts:
+        - 'states', 'next_states': (B, 5, 10, 10) float32 network planes
+        - 'actions': (B,) int64 move indices
+        - 'rewards', 'heuristic_scores': (B,) float32
+        - 'dones': (B,) bool
+        - 'boards': (B, 10, 10) int8 piece codes
+        
+        Args:
+            batch_size: Number of rows in the batch
+            recent_ratio: Fraction of the batch taken from the most recent games
+            player: Player color to filter by
+            pin_memory: Allocate the arrays in page-locked memory (as numpy
+                views) so they can be copied to the GPU with non_blocking=True
+            
+        Returns:
+            Dictionary of arrays, or None if the buffer can't fill a batch
+        """
+        batch = _empty_training_batch(batch_size, pin_memory)
+        recent_count = int(batch_size * recent_ratio)
+        
+        with self._read_conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT board_state, action, reward, next_state, done, heuristic_score,
+                       state_enc, next_state_enc
+                FROM trajectories
+                WHERE player = ?
+                ORDER BY timestamp DESC, move_number
+                LIMIT ?
+            """, (player, recent_count))
+            filled = _fill_training_rows(cursor, batch, 0)
+            
+            ids = self._sample_random_ids(cursor, player, batch_size - filled)
+            filled = self._fill_rows_by_id(cursor, batch, filled, ids)
+        
+        if filled < batch_size:
+            return None
+        return batch
+    
+    def _fill_rows_by_id(self, cursor, batch: Dict[str, np.ndarray], filled: int,
+                         ids: List[int]) -> int:
+        """Fetch the given trajectory ids into `batch` from slot `filled` on."""
+        cursor.execute(_SQL_TRAINING_ROWS, (_id_list(ids),))
+        return _fill_training_rows(cursor, batch, filled)
+    
+    def _sample_priority_ids(self, cursor, player: str, batch_size: int,
+                             temperature: float = 1.0) -> List[int]:
+        """
+        Draw up to `batch_size` distinct ids for `player` with probability
+        proportional to priority ** (1 / temperature).
+        
+        Gumbel-top-k: the k largest log(priority) / T + Gumbel noise are a
+        weighted sample without replacement, found with one O(N)
+        argpartition over the cached arrays of _priority_arrays. Zero
+        priorities rank below every positive one and are uniform among
+        themselves (so all-zero is uniform).
+        """
+        ids, priorities = self._priority_arrays(cursor, player)
+        if len(ids) == 0:
+            return []
+        
+        keys = self._rng.gumbel(size=len(ids))
+        positive = priorities > 0
+        keys[positive] += np.log(priorities[positive]) / temperature
+        keys[~positive] -= 1e6
+        
+        k = min(batch_size, len(ids))
+        if k < len(ids):
+            chosen = np.argpartition(-keys, k - 1)[:k]
+        else:
+            chosen = np.arange(len(ids))
+        return ids[chosen].tolist()
+    
+    def _priority_arrays(self, cursor, player: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Contiguous (ids, priorities) of `player`'s trajectories, in id order.
+        
+        Priorities are fixed at insert time, so the arrays are cached and
+        only rows past the last cached id are read; rows below MIN(id) (gone
+        to cleanup or clear_all) are dropped. Any other deleted id is caught
+        by the callers, which call _invalidate_priorities and sample again.
+        """
+        with self._priority_lock:
+            ids, priorities = self._priority_cache.get(
+                player, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)))
+            
+            cursor.execute("SELECT MIN(id) FROM trajectories")
+            low = cursor.fetchone()[0]
+            if low is None:
+                ids, priorities = ids[:0], priorities[:0]
+            else:
+                start = np.searchsorted(ids, low)
+                ids, priorities = ids[start:], priorities[start:]
+                
+                last_id = int(ids[-1]) if len(ids) else 0
+                cursor.execute(_SQL_NEW_PRIORITIES, (last_id, player))
+                rows = cursor.fetchall()
+                if rows:
+                    new = np.array(rows, dtype=np.float64)
+                    ids = np.concatenate((ids, new[:, 0].astype(np.int64)))
+                    priorities = np.concatenate((priorities, new[:, 1]))
+            
+            self._priority_cache[player] = (ids, priorities)
+            return ids, priorities
+    
+    def _invalidate_priorities(self, player: str):
+        """Drop `player`'s cached priorities (they named a deleted row)."""
+        with self._priority_lock:
+            self._priority_cache.pop(player, None)
+    
+    def get_prioritized_batch(self, batch_size: int = 32, player: str = "black",
+                              temperature: float = 1.0,
+                              pin_memory: bool = False) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Priority-sampled batch decoded straight into training arrays.
+        
+        Same sampling as get_prioritized_trajectories and the same arrays as
+        get_training_batch, without the per-row dicts.
+        
+        Returns:
+            Dictionary of arrays, or None if the buffer can't fill a batch
+        """
+        batch = _empty_training_batch(batch_size, pin_memory)
+        with self._read_conn as conn:
+            cursor = conn.cursor()
+            ids = self._sample_priority_ids(cursor, player, batch_size, temperature)
+            filled = self._fill_rows_by_id(cursor, batch, 0, ids)
+            if filled < len(ids):
+                # A cached id was deleted above MIN(id): resync and redraw
+                self._invalidate_priorities(player)
+                ids = self._sample_priority_ids(cursor, player, batch_size, temperature)
+                filled = self._fill_rows_by_id(cursor, batch, 0, ids)
+        
+        if filled < batch_size:
+            return None
+        return batch
+    
     def get_prioritized_trajectories(self, batch_size: int = 32, player: str = "black", 
                                      temperature: float = 1.0) -> List[Dict]:
         """
@@ -242,61 +913,58 @@ class ReplayBuffer:
         Returns:
             List of prioritized trajectories
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read_conn as conn:
             cursor = conn.cursor()
             
-            # Get all trajectories with their priorities
-            cursor.execute("""
-                SELECT t.board_state, t.action, t.reward, t.next_state, t.done, t.priority,
-                       t.heuristic_score, t.heuristic_move,
-                       ROW_NUMBER() OVER (ORDER BY RANDOM()) as rn
-                FROM trajectories t
-                WHERE t.player = ?
-            """, (player,))
-            
+            # Sample ids by priority, then fetch only the selected rows
+            ids = self._sample_priority_ids(cursor, player, batch_size, temperature)
+            cursor.execute(_SQL_PRIORITIZED_ROWS, (_id_list(ids),))
             rows = cursor.fetchall()
-            
-            if not rows:
-                return []
-            
-            # Extract priorities and apply temperature
-            priorities = [row[5] ** (1.0 / temperature) for row in rows]
-            total_priority = sum(priorities)
-            
-            if total_priority == 0:
-                # Fallback to uniform sampling
-                probabilities = [1.0 / len(rows)] * len(rows)
-            else:
-                probabilities = [p / total_priority for p in priorities]
-            
-            # Sample based on priorities
-            import numpy as np
-            selected_indices = np.random.choice(
-                len(rows), 
-                size=min(batch_size, len(rows)), 
-                replace=False,
-                p=probabilities
-            )
+            if len(rows) < len(ids):
+                # A cached id was deleted above MIN(id): resync and redraw
+                self._invalidate_priorities(player)
+                ids = self._sample_priority_ids(cursor, player, batch_size, temperature)
+                cursor.execute(_SQL_PRIORITIZED_ROWS, (_id_list(ids),))
+                rows = cursor.fetchall()
             
             # Build result
             results = []
-            for idx in selected_indices:
-                row = rows[idx]
+            for row in rows:
                 results.append({
-                    'board_state': json.loads(row[0]),
-                    'action': json.loads(row[1]),
+                    'board_state': _unpack_board(row[0]),
+                    'action': _unpack_action(row[1]),
                     'reward': row[2],
-                    'next_state': json.loads(row[3]),
+                    'next_state': _unpack_board(row[3]),
                     'done': bool(row[4]),
                     'heuristic_score': row[6],
-                    'heuristic_move': json.loads(row[7]) if row[7] else None
+                    'heuristic_move': _unpack_action(row[7]) if row[7] else None,
+                    'id': row[8],
+                    'state_enc': row[9],
+                    'next_state_enc': row[10]
                 })
             
             return results
     
+    def get_action_indices(self) -> List[int]:
+        """Distinct action indices (see encode_move) of every stored move."""
+        with self._read_conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT action FROM trajectories")
+            indices = set()
+            for (value,) in cursor.fetchall():
+                try:
+                    action = _unpack_action(value)
+                    index = encode_move(action['from'][0], action['from'][1],
+                                        action['to'][0], action['to'][1])
+                except Exception:
+                    continue
+                if index >= 0:
+                    indices.add(index)
+            return sorted(indices)
+    
     def get_game_trajectory(self, game_id: str) -> List[Dict]:
         """Get all trajectories for a specific game."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read_conn as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT board_state, action, reward, next_state, done, player
@@ -308,10 +976,10 @@ class ReplayBuffer:
             results = []
             for row in cursor.fetchall():
                 results.append({
-                    'board_state': json.loads(row[0]),
-                    'action': json.loads(row[1]),
+                    'board_state': _unpack_board(row[0]),
+                    'action': _unpack_action(row[1]),
                     'reward': row[2],
-                    'next_state': json.loads(row[3]),
+                    'next_state': _unpack_board(row[3]),
                     'done': bool(row[4]),
                     'player': row[5]
                 })
@@ -319,65 +987,43 @@ class ReplayBuffer:
             return results
     
     def get_stats(self) -> Dict:
-        """Get statistics about the replay buffer."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Total games
-            cursor.execute("SELECT COUNT(*) FROM games")
-            total_games = cursor.fetchone()[0]
-            
-            # Win statistics
-            cursor.execute("""
-                SELECT winner, COUNT(*) 
-                FROM games 
-                GROUP BY winner
-            """)
-            wins = dict(cursor.fetchall())
-            
-            # Total trajectories
-            cursor.execute("SELECT COUNT(*) FROM trajectories")
-            total_trajectories = cursor.fetchone()[0]
-            
-            # Average game length
-            cursor.execute("SELECT AVG(total_moves) FROM games")
-            avg_moves = cursor.fetchone()[0] or 0
-            
-            return {
-                'total_games': total_games,
-                'total_trajectories': total_trajectories,
-                'wins': wins,
-                'average_moves': avg_moves
-            }
+        """Get statistics about the replay buffer (from the trigger-maintained counters)."""
+        with self._read_conn as conn:
+            return _stats_from_rows(conn.execute("SELECT key, value FROM stats"))
+    
+    async def get_stats_async(self) -> Dict:
+        """get_stats() for async callers: runs on a pooled aiosqlite reader, off the event loop."""
+        async with self._async_reader() as conn:
+            async with conn.execute("SELECT key, value FROM stats") as cursor:
+                return _stats_from_rows(await cursor.fetchall())
     
     def _cleanup_old_games(self, conn):
         """Remove oldest games if exceeding max_games limit."""
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM games")
-        total_games = cursor.fetchone()[0]
+        cursor.execute("SELECT value FROM stats WHERE key = 'total_games'")
+        total_games = int(cursor.fetchone()[0])
         
         if total_games > self.max_games:
-            # Get oldest game IDs to delete
+            # Delete the oldest games from both tables in one statement each
+            # (game_id breaks timestamp ties so both pick the same games)
+            excess = (total_games - self.max_games,)
             cursor.execute("""
-                SELECT game_id FROM games
-                ORDER BY timestamp
-                LIMIT ?
-            """, (total_games - self.max_games,))
-            
-            old_game_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Delete from both tables
-            for game_id in old_game_ids:
-                cursor.execute("DELETE FROM trajectories WHERE game_id = ?", (game_id,))
-                cursor.execute("DELETE FROM games WHERE game_id = ?", (game_id,))
+                DELETE FROM trajectories WHERE game_id IN (
+                    SELECT game_id FROM games ORDER BY timestamp, game_id LIMIT ?
+                )
+            """, excess)
+            cursor.execute("""
+                DELETE FROM games WHERE game_id IN (
+                    SELECT game_id FROM games ORDER BY timestamp, game_id LIMIT ?
+                )
+            """, excess)
             
             conn.commit()
     
     def clear_all(self):
         """Clear all data from the replay buffer."""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM trajectories")
-                cursor.execute("DELETE FROM games")
-                conn.commit()
+        with self._write_lock, self._write_conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM trajectories")
+            cursor.execute("DELETE FROM games")
+            conn.commit()
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+# Add docs directory to path so we can import modules
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "docs")))
+
+from model.replay_buffer import ReplayBuffer
+
+def test_random_ids_uniform():
+    print("Testing ReplayBuffer random-id sampling...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rb = ReplayBuffer(db_path=os.path.join(tmp, "replay.db"))
+        try:
+            # Interleave the players so half of every draw is rejected
+            rows = 4000
+            rb.add_game("uniformity", "black", rows, 0.0)
+            rb.add_batch_trajectories("uniformity", [{
+                'move_number': i, 'board_state': {}, 'action': {'from': [0, 0], 'to': [1, 1]},
+                'reward': 0.0, 'next_state': {}, 'done': False,
+                'player': "black" if i % 2 == 0 else "white",
+            } for i in range(rows)])
+
+            with rb._read_conn as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MIN(id), MAX(id) FROM trajectories")
+                low, high = cursor.fetchone()
+                quarter = (high - low + 1) / 4
+                counts = [0, 0, 0, 0]
+                limit, samples = 200, 50
+                for _ in range(samples):
+                    ids = rb._sample_random_ids(cursor, "black", limit)
+                    if len(ids) != limit or len(set(ids)) != limit:
+                        print(f"FAIL: Expected {limit} distinct ids, got {len(set(ids))}")
+                        return False
+                    for traj_id in ids:
+                        counts[min(int((traj_id - low) / quarter), 3)] += 1
+        finally:
+            rb.close()
+
+    # Each quarter holds 1/4 of black's rows; allow 20% (~12 sigma) either way
+    expected = limit * samples / 4
+    print(f"Samples per id-range quarter (expected ~{expected:.0f}): {counts}")
+    if all(abs(c - expected) <= 0.2 * expected for c in counts):
+        print("SUCCESS: Random ids are spread evenly across the id range")
+        return True
+    print("FAIL: Random ids are skewed across the id range")
+    return False
+
+if __name__ == "__main__":
+    success = test_random_ids_uniform()
+    sys.exit(0 if success else 1)
@@ -102,9 +102,12 @@ def check_model():
         from model.network import PolicyValueNet
         import torch
         
-        model = PolicyValueNet()
-        # Test forward pass
-        test_input = torch.randn(1, 5, 10, 10)
+        # Build and run the model on the meta device: shapes are checked
+        # without allocating or initializing the weights or doing the math
+        with torch.device('meta'):
+            model = PolicyValueNet()
+            # Test forward pass
+            test_input = torch.randn(1, 5, 10, 10)
         with torch.no_grad():
             policy, value = model(test_input)
         
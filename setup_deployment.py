@@ -72,9 +72,11 @@ Thumbs.db
         print("     ✓ runtime.txt created")
     
     print("[4/4] Checking deployment files...")
-    print(f"     ✓ render.yaml: {'exists' if (root / 'render.yaml').exists() else 'MISSING'}")
-    print(f"     ✓ Procfile: {'exists' if (root / 'Procfile').exists() else 'MISSING'}")
-    print(f"     ✓ DEPLOYMENT.md: {'exists' if (root / 'DEPLOYMENT.md').exists() else 'MISSING'}")
+    # One directory listing answers all three checks
+    with os.scandir(root) as it:
+        entries = {entry.name for entry in it}
+    for name in ("render.yaml", "Procfile", "DEPLOYMENT.md"):
+        print(f"     ✓ {name}: {'exists' if name in entries else 'MISSING'}")
     
     print()
     print("=" * 60)
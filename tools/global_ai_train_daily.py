@@ -2,7 +2,10 @@ import json
 import os
 import sys
 import tempfile
+import hashlib
 import importlib.util
+import inspect
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -10,6 +13,12 @@ from typing import Any
 
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional locally; installed by requirements_global_ai.txt
+    orjson = None
 
 """Global AI daily training (TF.js).
 
@@ -24,6 +33,13 @@ Pipeline:
 """
 
 
+# Every Supabase request goes through this session: auth headers are set
+# once in main(), and the parallel Storage uploads share its keep-alive pool
+UPLOAD_WORKERS = 8
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=UPLOAD_WORKERS, pool_maxsize=UPLOAD_WORKERS))
+
+
 @dataclass
 class Env:
     supabase_url: str
@@ -33,6 +49,8 @@ class Env:
     max_steps: int
     epochs: int
     batch_size: int
+    # Optional directory of per-log encoded shards, reused across runs
+    cache_dir: Path | None = None
 
 
 def _require_env(name: str) -> str:
@@ -49,129 +67,262 @@ def _supabase_headers(service_key: str) -> dict[str, str]:
     }
 
 
-def fetch_game_logs(env: Env) -> list[dict[str, Any]]:
+# fetch_game_logs over-fetches by this factor of max_steps: _encode_log can
+# still drop steps that pass _iter_steps (unknown moves, bad squares)
+_FETCH_STEP_MARGIN = 1.1
+
+
+def fetch_game_logs(env: Env, page_size: int = 500) -> list[dict[str, Any]]:
     since = datetime.now(timezone.utc) - timedelta(days=env.days_back)
     since_iso = since.isoformat()
 
-    # PostgREST endpoint
+    # PostgREST endpoint, read in pages (each under Supabase's max-rows cap)
+    # until the window is exhausted or build_dataset has max_steps to use
     url = env.supabase_url.rstrip("/") + "/rest/v1/game_logs"
-    params = {
-        "select": "id,created_at,game_id,winner,trajectory,total_moves,duration_seconds",
-        "created_at": f"gte.{since_iso}",
-        "order": "created_at.desc",
-        "limit": "2000",
-    }
+    logs: list[dict[str, Any]] = []
+    steps = 0
+    while True:
+        params = {
+            # Only what build_dataset (trajectory, id for the encode cache)
+            # and the keyset cursor (created_at, id) read
+            "select": "id,created_at,trajectory",
+            "created_at": f"gte.{since_iso}",
+            # id breaks created_at ties, so the keyset below is exact
+            "order": "created_at.desc,id.desc",
+            "limit": str(page_size),
+        }
+        if logs:
+            # Keyset cursor: rows strictly after the last one (no deep
+            # OFFSET scans, and logs inserted meanwhile can't shift pages)
+            last_ts, last_id = logs[-1]["created_at"], logs[-1]["id"]
+            params["or"] = (
+                f'(created_at.lt."{last_ts}",'
+                f'and(created_at.eq."{last_ts}",id.lt."{last_id}"))'
+            )
 
-    r = requests.get(
-        url, headers=_supabase_headers(env.service_role_key), params=params, timeout=60
-    )
-    if not r.ok:
-        raise RuntimeError(
-            "Supabase REST fetch failed:\n"
-            f"  url: {r.url}\n"
-            f"  status: {r.status_code}\n"
-            f"  body: {r.text[:2000]}"
-        )
-    data = r.json()
-    if not isinstance(data, list):
-        return []
-    return data
+        r = _SESSION.get(url, params=params, timeout=60)
+        if not r.ok:
+            raise RuntimeError(
+                "Supabase REST fetch failed:\n"
+                f"  url: {r.url}\n"
+                f"  status: {r.status_code}\n"
+                f"  body: {r.text[:2000]}"
+            )
+        # The trajectory arrays make these pages large; orjson parses them
+        # several times faster than the stdlib json behind r.json()
+        data = orjson.loads(r.content) if orjson is not None else r.json()
+        if not isinstance(data, list):
+            break
+        logs.extend(data)
+        # Count steps the way build_dataset does (malformed ones are skipped
+        # there), with a margin for the few the encoder still rejects
+        steps += sum(sum(1 for _ in _iter_steps(log.get("trajectory"))) for log in data)
+        if len(data) < page_size or steps >= env.max_steps * _FETCH_STEP_MARGIN:
+            break
+    return logs
 
 
-def build_dataset(game_logs: list[dict[str, Any]], env: Env) -> tuple[np.ndarray, np.ndarray]:
-    repo_root = Path(__file__).resolve().parents[1]
-    encoder_path = repo_root / "docs" / "model" / "encoder.py"
+ENCODER_PATH = Path(__file__).resolve().parents[1] / "docs" / "model" / "encoder.py"
+
+# Part of every encode-cache shard key: bump on any change to what a shard
+# holds that the hashed sources below don't capture
+_ENCODE_CACHE_VERSION = 2
+
+
+def _load_encoder():
+    encoder_path = ENCODER_PATH
     spec = importlib.util.spec_from_file_location("checkers_encoder", encoder_path)
     if spec is None or spec.loader is None:
         raise RuntimeError(f"Failed to load encoder module from: {encoder_path}")
     encoder_mod = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(encoder_mod)  # type: ignore[union-attr]
+    return encoder_mod
 
-    encode_state = getattr(encoder_mod, "encode_state")
-    encode_move = getattr(encoder_mod, "encode_move")
 
-    x_list: list[np.ndarray] = []
-    y_list: list[int] = []
+def _iter_steps(traj: Any):
+    """Yield (board, (from_row, from_col, to_row, to_col)) for every well-formed step."""
+    if not isinstance(traj, list):
+        return
 
-    steps_used = 0
-    for log in game_logs:
-        traj = log.get("trajectory")
-        if not isinstance(traj, list):
+    for step in traj:
+        if not isinstance(step, dict):
             continue
 
-        for step in traj:
-            if steps_used >= env.max_steps:
-                break
-            if not isinstance(step, dict):
+        board = step.get("board_state")
+        action = step.get("action")
+        if not isinstance(action, dict):
+            continue
+        # A board is a JSON string (parsed by board_to_codes) or 10 rows of
+        # 10 squares; reject other shapes here rather than by exception
+        if isinstance(board, list):
+            if len(board) != 10 or not all(isinstance(row, list) and len(row) == 10 for row in board):
                 continue
+        elif not isinstance(board, str):
+            continue
 
-            board = step.get("board_state")
-            action = step.get("action")
-            if board is None or not isinstance(action, dict):
-                continue
+        fr = action.get("from")
+        to = action.get("to")
+        if (
+            not isinstance(fr, list)
+            or not isinstance(to, list)
+            or len(fr) != 2
+            or len(to) != 2
+        ):
+            continue
 
-            fr = action.get("from")
-            to = action.get("to")
-            if (
-                not isinstance(fr, list)
-                or not isinstance(to, list)
-                or len(fr) != 2
-                or len(to) != 2
-            ):
-                continue
+        move = (fr[0], fr[1], to[0], to[1])
+        if not all(type(v) is int and 0 <= v < 10 for v in move):
+            continue
+        yield board, move
 
-            try:
-                state = encode_state(board)  # (5,10,10)
-                idx = encode_move(int(fr[0]), int(fr[1]), int(to[0]), int(to[1]))
-            except Exception:
-                continue
 
-            if idx < 0 or idx >= 2500:
-                continue
+def _encode_log(log: dict[str, Any], encoder_mod) -> tuple[np.ndarray, np.ndarray]:
+    """(piece codes (n,10,10) int8, move indices (n,) int32) of a log's valid steps."""
+    steps = list(_iter_steps(log.get("trajectory")))
+    codes = np.empty((len(steps), 10, 10), dtype=np.int8)
+    y = np.empty((len(steps),), dtype=np.int32)
+    if not steps:
+        return codes, y
+
+    indices = encoder_mod.encode_moves(np.array([move for _, move in steps], dtype=np.int64))
+    n = 0
+    for (board, _), idx in zip(steps, indices):
+        if idx < 0:
+            continue
+        try:
+            codes[n] = encoder_mod.board_to_codes(board)
+        except Exception:
+            # Only boards that passed _iter_steps' shape checks get here
+            # (e.g. a square that is neither null nor a piece object)
+            continue
+        y[n] = idx
+        n += 1
+    return codes[:n], y[:n]
 
-            # TF.js model will use channels-last: (10,10,5)
-            state_cl = np.transpose(state, (1, 2, 0)).astype(np.float32)
-            x_list.append(state_cl)
-            y_list.append(int(idx))
-            steps_used += 1
 
+def _prune_cache(cache_dir: Path, keep: set[str]) -> None:
+    # Logs outside the fetch window are never requested again
+    for shard in cache_dir.glob("*.npz"):
+        if shard.name not in keep:
+            shard.unlink(missing_ok=True)
+
+
+def build_dataset(game_logs: list[dict[str, Any]], env: Env) -> tuple[np.ndarray, np.ndarray]:
+    encoder_mod = _load_encoder()
+
+    # Shards are keyed by log id and everything that decides their contents
+    # (the encoder, the step filter and per-log encoding here, and
+    # _ENCODE_CACHE_VERSION), so editing any of them invalidates every shard
+    cache_dir = env.cache_dir
+    key_source = hashlib.sha256(ENCODER_PATH.read_bytes())
+    for fn in (_iter_steps, _encode_log):
+        key_source.update(inspect.getsource(fn).encode())
+    key_source.update(str(_ENCODE_CACHE_VERSION).encode())
+    encoder_hash = key_source.hexdigest()[:12]
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    hits = 0
+    used = 0
+
+    # Per step only the board is parsed (into 100 piece codes); move indices
+    # are encoded per log and the one-hot planes for the whole dataset at once.
+    codes_parts: list[np.ndarray] = []
+    y_parts: list[np.ndarray] = []
+    steps_used = 0
+    for log in game_logs:
         if steps_used >= env.max_steps:
             break
 
-    if not x_list:
-        return np.zeros((0, 10, 10, 5), dtype=np.float32), np.zeros((0,), dtype=np.int32)
-
-    x = np.stack(x_list, axis=0)
-    y = np.asarray(y_list, dtype=np.int32)
+        shard = None
+        if cache_dir is not None and log.get("id") is not None:
+            shard = cache_dir / f"{log['id']}_{encoder_hash}.npz"
+            used += 1
+
+        if shard is not None and shard.exists():
+            with np.load(shard) as cached:
+                codes, y = cached["codes"], cached["y"]
+            hits += 1
+        else:
+            codes, y = _encode_log(log, encoder_mod)
+            if shard is not None:
+                np.savez(shard, codes=codes, y=y)
+
+        codes_parts.append(codes)
+        y_parts.append(y)
+        steps_used += len(y)
+
+    if cache_dir is not None:
+        _prune_cache(cache_dir, {
+            f"{log['id']}_{encoder_hash}.npz" for log in game_logs if log.get("id") is not None
+        })
+        print(f"Encode cache: {hits}/{used} logs reused")
+
+    if not codes_parts:
+        return np.zeros((0, 10, 10, 5), dtype=np.uint8), np.zeros((0,), dtype=np.int32)
+
+    codes = np.concatenate(codes_parts)[: env.max_steps]
+    y = np.concatenate(y_parts)[: env.max_steps]
+
+    # TF.js model will use channels-last: (10,10,5). Channels 0-3 one-hot the
+    # piece codes 1-4, channel 4 is the dark-square mask (as encode_state).
+    # The planes are 0/1, so they are kept as uint8 (a quarter of float32)
+    # and cast to float32 per batch in the training pipeline.
+    x = np.empty((len(codes), 10, 10, 5), dtype=np.uint8)
+    np.equal(codes[..., None], np.arange(1, 5, dtype=np.int8), out=x[..., :4], casting="unsafe")
+    x[..., 4] = encoder_mod.DARK_MASK
     return x, y
 
 
 def train_tfjs_policy_model(x: np.ndarray, y: np.ndarray, env: Env):
+    # Must be set before TensorFlow initializes (oneDNN is the default on
+    # x86 Linux builds; setdefault keeps any value set by the caller)
+    os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")
     import tensorflow as tf
 
+    # One op at a time across all of the runner's cores: the graph is a
+    # plain chain, so inter-op threads would only compete for the same CPUs
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    tf.config.threading.set_intra_op_parallelism_threads(cores)
+
     tf.random.set_seed(123)
 
     inputs = tf.keras.Input(shape=(10, 10, 5), name="state")
     z = tf.keras.layers.Conv2D(64, 3, padding="same", activation="relu")(inputs)
     z = tf.keras.layers.Conv2D(64, 3, padding="same", activation="relu")(z)
+    # 1x1 conv down to 8 planes before flattening (as the PyTorch policy head
+    # does): Dense(256) then sees 800 features instead of 6400, which removes
+    # ~1.4M of the model's ~2.3M weights while keeping per-square information
+    z = tf.keras.layers.Conv2D(8, 1, activation="relu")(z)
     z = tf.keras.layers.Flatten()(z)
     z = tf.keras.layers.Dense(256, activation="relu")(z)
-    policy = tf.keras.layers.Dense(2500, activation="softmax", name="policy")(z)
+    # Logits: the loss applies its own log-softmax (see export_tfjs)
+    policy = tf.keras.layers.Dense(2500, name="policy")(z)
     model = tf.keras.Model(inputs=inputs, outputs=policy)
 
     model.compile(
         optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3),
-        loss=tf.keras.losses.SparseCategoricalCrossentropy(),
+        loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
         metrics=["sparse_categorical_accuracy"],
+        # Compile the train step with XLA (fuses the small conv/dense stack)
+        # and run 64 steps per call to cut per-step Python dispatch
+        jit_compile=True,
+        steps_per_execution=64,
     )
 
     if len(x) > 0:
+        # x is uint8 0/1 planes (see build_dataset); widen each batch to the
+        # float32 the model takes instead of holding a float32 copy of it all
+        dataset = (
+            tf.data.Dataset.from_tensor_slices((x, y))
+            .shuffle(len(x))
+            .batch(env.batch_size)
+            .map(lambda s, l: (tf.cast(s, tf.float32), l), num_parallel_calls=tf.data.AUTOTUNE)
+            .prefetch(tf.data.AUTOTUNE)
+        )
         model.fit(
-            x,
-            y,
+            dataset,
             epochs=env.epochs,
-            batch_size=env.batch_size,
-            shuffle=True,
             verbose=2,
         )
 
@@ -190,19 +341,25 @@ def export_tfjs(model, out_dir: Path) -> None:
     if "bool" not in np.__dict__:
         np.bool = np.bool_  # type: ignore[attr-defined]
 
+    import tensorflow as tf
     import tensorflowjs as tfjs
 
+    # The model is trained on logits; the browser model keeps returning
+    # move probabilities, so append the softmax for export only
+    probs = tf.keras.layers.Softmax(name="policy_probs")(model.output)
+    model = tf.keras.Model(inputs=model.input, outputs=probs)
+
     out_dir.mkdir(parents=True, exist_ok=True)
-    tfjs.converters.save_keras_model(model, str(out_dir))
+    # One weights file (the default splits at 4 MB): model.json + a single
+    # .bin means two uploads here and two fetches in the browser
+    tfjs.converters.save_keras_model(model, str(out_dir), weight_shard_size_bytes=1 << 30)
 
 
 def upload_storage_file(env: Env, local_path: Path, storage_path: str, content_type: str) -> None:
     url = env.supabase_url.rstrip("/") + f"/storage/v1/object/{env.bucket}/{storage_path.lstrip('/')}"
-    headers = _supabase_headers(env.service_role_key)
-    headers["content-type"] = content_type
-    headers["x-upsert"] = "true"
+    headers = {"content-type": content_type, "x-upsert": "true"}
     with local_path.open("rb") as f:
-        r = requests.post(url, headers=headers, data=f, timeout=120)
+        r = _SESSION.post(url, headers=headers, data=f, timeout=120)
         if not r.ok:
             raise RuntimeError(
                 "Supabase Storage upload failed:\n"
@@ -214,6 +371,38 @@ def upload_storage_file(env: Env, local_path: Path, storage_path: str, content_t
             )
 
 
+def storage_object_exists(env: Env, storage_path: str) -> bool:
+    url = env.supabase_url.rstrip("/") + f"/storage/v1/object/{env.bucket}/{storage_path.lstrip('/')}"
+    # stream=True: only the status line is needed, not the object body
+    with _SESSION.get(url, stream=True, timeout=30) as r:
+        return r.ok
+
+
+def fetch_storage_json(env: Env, storage_path: str) -> dict[str, Any] | None:
+    url = env.supabase_url.rstrip("/") + f"/storage/v1/object/{env.bucket}/{storage_path.lstrip('/')}"
+    r = _SESSION.get(url, timeout=30)
+    if not r.ok:
+        return None
+    try:
+        data = r.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def upload_manifest(env: Env, manifest: dict[str, Any], tmp: str) -> None:
+    manifest_path = Path(tmp) / "latest.json"
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    upload_storage_file(env, manifest_path, "tfjs/latest.json", "application/json")
+
+
+def weights_digest(model) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for w in model.get_weights():
+        h.update(np.ascontiguousarray(w).tobytes())
+    return h.hexdigest()
+
+
 def public_object_url(env: Env, storage_path: str) -> str:
     base = env.supabase_url.rstrip("/")
     return f"{base}/storage/v1/object/public/{env.bucket}/{storage_path.lstrip('/')}"
@@ -229,11 +418,16 @@ def main() -> int:
             max_steps=int(os.getenv("GLOBAL_AI_MAX_STEPS", "20000")),
             epochs=int(os.getenv("GLOBAL_AI_EPOCHS", "1")),
             batch_size=int(os.getenv("GLOBAL_AI_BATCH_SIZE", "256")),
+            cache_dir=Path(os.environ["GLOBAL_AI_ENCODE_CACHE_DIR"])
+            if os.getenv("GLOBAL_AI_ENCODE_CACHE_DIR")
+            else None,
         )
     except Exception as e:
         print(str(e))
         return 2
 
+    _SESSION.headers.update(_supabase_headers(env.service_role_key))
+
     print("Fetching game logs...")
     logs = fetch_game_logs(env)
     print(f"Fetched {len(logs)} game logs")
@@ -242,6 +436,12 @@ def main() -> int:
     x, y = build_dataset(logs, env)
     print(f"Training steps: {len(x)}")
     if len(x) == 0:
+        # Nothing to learn from: keep the published model (and its manifest
+        # version, so browsers keep their cached copy) without importing
+        # TensorFlow. Only a site with no model yet gets a baseline.
+        if storage_object_exists(env, "tfjs/latest/model.json"):
+            print("No training data found in the last window; keeping the published model.")
+            return 0
         print(
             "No training data found in the last window; publishing a baseline model so the site can load it."
         )
@@ -249,6 +449,17 @@ def main() -> int:
     print("Training model...")
     model = train_tfjs_policy_model(x, y, env)
 
+    # Identical weights (e.g. the same data as the last run): refresh the
+    # manifest's updated_at but keep its version and files, so browsers keep
+    # their cached model instead of re-downloading the same bytes
+    weights_hash = weights_digest(model)
+    previous = fetch_storage_json(env, "tfjs/latest.json")
+    if previous is not None and previous.get("weights_hash") == weights_hash:
+        with tempfile.TemporaryDirectory() as tmp:
+            upload_manifest(env, {**previous, "updated_at": datetime.now(timezone.utc).isoformat()}, tmp)
+        print("Trained weights match the published model; refreshed the manifest only")
+        return 0
+
     version = datetime.now(timezone.utc).strftime("%Y%m%d")
     with tempfile.TemporaryDirectory() as tmp:
         out_dir = Path(tmp) / "tfjs" / "latest"
@@ -257,21 +468,25 @@ def main() -> int:
         # Upload TF.js files
         # Expected files include model.json and one or more *.bin
         storage_prefix = "tfjs/latest"
-        for p in out_dir.iterdir():
-            if p.is_dir():
-                continue
+
+        def upload_model_file(p: Path) -> None:
             ct = "application/json" if p.suffix == ".json" else "application/octet-stream"
             upload_storage_file(env, p, f"{storage_prefix}/{p.name}", ct)
 
+        # The files are independent, so upload them concurrently; the
+        # manifest below only goes up once all of them have succeeded
+        files = [p for p in out_dir.iterdir() if not p.is_dir()]
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            list(pool.map(upload_model_file, files))
+
         model_url = public_object_url(env, f"{storage_prefix}/model.json")
         latest_manifest = {
             "version": version,
             "model_url": model_url,
             "updated_at": datetime.now(timezone.utc).isoformat(),
+            "weights_hash": weights_hash,
         }
-        manifest_path = Path(tmp) / "latest.json"
-        manifest_path.write_text(json.dumps(latest_manifest, indent=2), encoding="utf-8")
-        upload_storage_file(env, manifest_path, "tfjs/latest.json", "application/json")
+        upload_manifest(env, latest_manifest, tmp)
 
         print("Published TF.js model")
         print(f"Manifest: {public_object_url(env, 'tfjs/latest.json')}")